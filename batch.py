@@ -0,0 +1,128 @@
+"""Batch evaluation of candidate solutions across worker processes.
+
+Each candidate is a (level, placements) pair: the level is an index into
+`levels` or a level dict, and placements the (x, y) road tiles to pave.
+Every candidate is played to its outcome with the game's own turn rules
+(`Simulation.run`). Candidates are read from the iterable a chunk at a time
+and only a few chunks per worker are ever in flight, so a batch of millions
+runs in bounded memory and results start arriving straight away:
+
+    for result in evaluate_batch(candidates, levels="levels.pack"):
+        print(result.index, result.outcome, result.turns_used, result.tiles_used)
+
+`levels` is sent to each worker once: a list of levels is pickled a single
+time per worker, and a level pack path is opened by each worker itself.
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from cooperative import CooperativePlanner
+from simulation import Simulation
+
+INVALID = "Invalid placement"  # Outcome of a candidate that could not be paved
+
+class Evaluation:
+    """How one candidate played out."""
+
+    __slots__ = ("index", "outcome", "turns_used", "tiles_used", "reason")
+
+    def __init__(self, index, outcome, turns_used, tiles_used, reason=None):
+        self.index = index            # Position of the candidate in the input
+        self.outcome = outcome        # SUCCESS, FAIL or INVALID
+        self.turns_used = turns_used
+        self.tiles_used = tiles_used
+        self.reason = reason          # Why the level failed or could not be paved
+
+    def __repr__(self):
+        return (f"Evaluation({self.index}, {self.outcome!r}, turns_used={self.turns_used}, "
+                f"tiles_used={self.tiles_used})")
+
+def evaluate(level, placements, cooperative=False):
+    """Plays one candidate; returns (outcome, turns used, tiles used, reason)."""
+    planner = CooperativePlanner() if cooperative else None
+    try:
+        sim = Simulation.from_level(level, placements=placements, planner=planner)
+    except ValueError as error:
+        return INVALID, 0, 0, str(error)
+    outcome = sim.run()
+    return outcome, sim.turns_used, sim.tile_count, sim.reason
+
+# ================================
+# Worker processes
+# ================================
+_worker_levels = None
+
+def _init_worker(levels):
+    global _worker_levels
+    if isinstance(levels, str):
+        from levelpack import LevelPack
+        levels = LevelPack(levels)
+    _worker_levels = levels
+
+def _evaluate_chunk(chunk, cooperative):
+    results = []
+    for level, placements in chunk:
+        if isinstance(level, int):
+            level = _worker_levels[level]
+        results.append(evaluate(level, placements, cooperative))
+    return results
+
+def _chunks(candidates, chunk_size):
+    candidates = iter(candidates)
+    while True:
+        chunk = list(islice(candidates, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def evaluate_batch(candidates, levels=None, workers=None, chunk_size=256, cooperative=False):
+    """Yields an `Evaluation` per candidate, in input order, computed in worker processes.
+
+    At most two chunks per worker are queued, running or held at once:
+    results that finish ahead of an earlier chunk wait for it, so input
+    order is kept, and count against that limit until they are yielded.
+    With `workers=1` everything runs in this process, which is easier to debug.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(candidates, chunk_size)
+    if workers == 1:
+        _init_worker(levels)
+        index = 0
+        for chunk in chunks:
+            for result in _evaluate_chunk(chunk, cooperative):
+                yield Evaluation(index, *result)
+                index += 1
+        return
+
+    next_chunk = 0    # Number of the next chunk to submit
+    next_yield = 0    # Number of the next chunk whose results may be yielded
+    index = 0
+    finished = {}     # chunk number -> results, waiting for earlier chunks
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(levels,)) as executor:
+        pending = {}
+        exhausted = False
+        try:
+            while True:
+                # A slow chunk holds back the ones after it; they count until yielded
+                while not exhausted and len(pending) + len(finished) < 2 * workers:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    pending[executor.submit(_evaluate_chunk, chunk, cooperative)] = next_chunk
+                    next_chunk += 1
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finished[pending.pop(future)] = future.result()
+                while next_yield in finished:
+                    for result in finished.pop(next_yield):
+                        yield Evaluation(index, *result)
+                        index += 1
+                    next_yield += 1
+        finally:
+            # The caller may stop early; queued chunks are dropped rather than run
+            for future in pending:
+                future.cancel()
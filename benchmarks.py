@@ -0,0 +1,386 @@
+"""Benchmarks for pathfinding, turn processing and rendering.
+
+Runs under SDL's dummy video driver, so it works on headless CI boxes:
+
+    python benchmarks.py --out results.json
+    python benchmarks.py --baseline results.json --threshold 0.25
+
+Every benchmark reports throughput and latency percentiles. With
+`--baseline`, the run fails (exit code 1) when a benchmark's median latency
+is more than `threshold` slower than in the saved results.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+
+import pathwaypaver as game
+import presets
+from batch import evaluate_batch
+from cooperative import CooperativePlanner
+from pathfinding import FieldCache, field_memo, find_path, path_memo
+from simulation import Simulation
+from solver import solve
+from thumbnails import render_thumbnail
+from traffic import Traffic
+
+BENCHMARKS = []
+
+def benchmark(name, **options):
+    """Registers `setup()`, which returns the callable to time; `options` go to `measure`.
+
+    A setup that changes the game's globals returns (callable, teardown)
+    instead, and `teardown()` puts them back once the benchmark has run.
+    """
+    def register(setup):
+        BENCHMARKS.append((name, setup, options))
+        return setup
+    return register
+
+# ================================
+# Fixtures
+# ================================
+_solutions = {}
+
+def solution(index):
+    """Minimum-tile placement for a shipped level (solved once per run)."""
+    if index not in _solutions:
+        _solutions[index] = solve(presets.levels[index], time_limit=30).placements or []
+    return _solutions[index]
+
+def large_layout(cols, rows, cars, seed=0):
+    """An open grid with trees round the edge of a road network and `cars` car/house pairs."""
+    rng = random.Random(seed)
+    layout = [[1 if rng.random() < 0.85 else 4 for _ in range(cols)] for _ in range(rows)]
+    cells = rng.sample([(x, y) for y in range(rows) for x in range(cols)], 2 * cars)
+    for car_id in range(cars):
+        (cx, cy), (hx, hy) = cells[2 * car_id], cells[2 * car_id + 1]
+        layout[cy][cx] = 80 + car_id
+        layout[hy][hx] = 90 + car_id
+    return layout
+
+def fleet_layout(cols, rows, cars, seed=0):
+    """An all-road grid with `cars` extra cars parked on a sparse lattice, for levels' "cars" list."""
+    rng = random.Random(seed)
+    layout = [[1] * cols for _ in range(rows)]
+    lattice = [(x, y) for y in range(0, rows, 3) for x in range(0, cols, 3)]
+    parked = set(lattice)
+    starts = rng.sample(lattice, cars)
+    houses = rng.sample([(x, y) for y in range(rows) for x in range(cols) if (x, y) not in parked], cars)
+    entries = []
+    for (x, y), (hx, hy) in zip(starts, houses):
+        layout[y][x] = layout[hy][hx] = 0
+        entries.append((x, y, hx, hy))
+    return layout, entries
+
+def start_level(index):
+    """Loads a shipped level into the game's globals with its solution paved."""
+    game.init_display()
+    game.currentLevel = index
+    game.load_level_objectives()
+    for x, y in solution(index):
+        game.simulation.toggle_tile(x, y)
+    game.grid_renderer.rebuild()
+    game.refresh_route_previews()
+    game.current_tile_count = game.simulation.tile_count
+    game.turns_left = game.simulation.turns_left
+    game.move_mode = False
+    game.game_outcome = None
+
+# ================================
+# Pathfinding
+# ================================
+def _register_level_benchmarks(index):
+    name = f"level{index + 1}"
+
+    @benchmark(f"path/find_path/{name}")
+    def setup_find_path():
+        sim = Simulation.from_level(presets.levels[index], placements=solution(index))
+        return lambda: [find_path(sim.grid, (car.x, car.y), car.destination) for car in sim.cars]
+
+    @benchmark(f"path/toggle_repair/{name}")
+    def setup_toggle():
+        sim = Simulation.from_level(presets.levels[index], placements=solution(index))
+        for car in sim.cars:
+            sim.route(car)
+        x, y = solution(index)[len(solution(index)) // 2]
+        def toggle():
+            sim.toggle_tile(x, y)
+            sim.toggle_tile(x, y)
+        return toggle
+
+    @benchmark(f"path/restart_cold/{name}")
+    def setup_restart_cold():
+        def restart():
+            field_memo.clear()
+            path_memo.clear()
+            sim = Simulation.from_level(presets.levels[index], placements=solution(index))
+            return [sim.route(car) for car in sim.cars]
+        return restart
+
+    @benchmark(f"path/restart_memo/{name}")
+    def setup_restart_memo():
+        # The same grid again, as on a restart: every route is a memo hit
+        def restart():
+            sim = Simulation.from_level(presets.levels[index], placements=solution(index))
+            return [sim.route(car) for car in sim.cars]
+        return restart
+
+    @benchmark(f"turns/run/{name}")
+    def setup_run():
+        return lambda: Simulation.from_level(presets.levels[index], placements=solution(index)).run()
+
+    @benchmark(f"render/draw_grid_level/{name}")
+    def setup_draw_grid():
+        start_level(index)
+        return game.draw_grid_level
+
+    @benchmark(f"render/rebuild_background/{name}")
+    def setup_rebuild():
+        start_level(index)
+        def rebuild():
+            # Chunks are painted lazily, so time the repaint of everything in view
+            game.grid_renderer.rebuild()
+            game.draw_grid_level()
+        return rebuild
+
+    @benchmark(f"render/frame_full/{name}")
+    def setup_frame_full():
+        start_level(index)
+        def frame():
+            game.grid_renderer.invalidate()
+            game.draw_level_frame(None)
+        return frame
+
+    @benchmark(f"render/frame_click/{name}")
+    def setup_frame_click():
+        start_level(index)
+        state = game.draw_level_frame(None)
+        x, y = solution(index)[0]
+        pos = game.camera.cell_rect(x, y).move(1, 1).topleft
+        def frame():
+            game.current_tile_count = game.handle_tile_click(pos[0], pos[1], game.current_tile_count)
+            game.draw_level_frame(state)
+        return frame
+
+    @benchmark(f"render/frame_idle/{name}")
+    def setup_frame_idle():
+        start_level(index)
+        state = game.draw_level_frame(None)
+        return lambda: game.draw_level_frame(state)
+
+for _index in range(len(presets.levels)):
+    _register_level_benchmarks(_index)
+
+@benchmark("path/find_path/large-200x200-10cars")
+def setup_large_find_path():
+    sim = Simulation(large_layout(200, 200, 10), max_turns=10000)
+    return lambda: [find_path(sim.grid, (car.x, car.y), car.destination) for car in sim.cars]
+
+@benchmark("path/shared_fields/large-200x200-10cars")
+def setup_large_fields():
+    sim = Simulation(large_layout(200, 200, 10), max_turns=10000)
+    def plan():
+        fields = FieldCache(sim.grid)
+        return [fields.path((car.x, car.y), car.destination) for car in sim.cars]
+    return plan
+
+@benchmark("path/connectivity_toggle/large-500x500-10cars")
+def setup_large_connectivity():
+    sim = Simulation(large_layout(500, 500, 10), max_turns=10000)
+    sim.connectivity  # Built once when the level loads; time only the clicks
+    rng = random.Random(1)
+    roads = rng.sample([(x, y) for y, row in enumerate(sim.grid) for x, tile in enumerate(row) if tile == 1], 50)
+    for x, y in roads:
+        sim.remove_tile(x, y)
+    def toggle():
+        for x, y in roads:
+            sim.toggle_tile(x, y)
+        return [sim.connected(car) for car in sim.cars]
+    return toggle
+
+@benchmark("turns/run/large-100x100-10cars")
+def setup_large_run():
+    layout = large_layout(100, 100, 10)
+    return lambda: Simulation(layout, max_turns=10000).run()
+
+@benchmark("turns/traffic/fleet-60x60-300cars")
+def setup_fleet():
+    layout, entries = fleet_layout(60, 60, 300)
+    sim = Simulation(layout, max_turns=10000, cars=entries)
+    sim.start()
+    def run():
+        traffic = Traffic(sim.cols, sim.rows)
+        for car in sim.by_slot:
+            traffic.add_car(car.id, car.x, car.y, car.destination)
+        traffic.set_paths([car.path for car in sim.by_slot])
+        while traffic.driving and traffic.step() is None:
+            pass
+    return run
+
+@benchmark("plan/cooperative/fleet-45x45-150cars")
+def setup_cooperative():
+    layout, entries = fleet_layout(45, 45, 150)
+    sim = Simulation(layout, max_turns=10000, cars=entries)
+    for car in sim.cars:
+        sim.route(car)  # Distance fields are shared with the default planner; time only the search
+    return lambda: CooperativePlanner()(sim)
+
+@benchmark("render/frame_pan/large-500x500")
+def setup_large_pan():
+    game.init_display()
+    saved = game.levels, game.currentLevel
+    # A list of its own: presets.levels is shared with every other benchmark
+    game.levels = list(presets.levels) + [{"name": "Large", "layout": large_layout(500, 500, 10),
+                                           "max_tiles": 100, "max_turns": 2000}]
+    game.currentLevel = len(game.levels) - 1
+    game.load_level_objectives()
+    game.camera.pan(250 * game.camera.tile_size, 250 * game.camera.tile_size)
+    state = game.draw_level_frame(None)
+    moves = [(37, 11), (-37, -11)]
+    def frame():
+        moves.reverse()
+        game.camera.pan(*moves[0])
+        game.grid_renderer.invalidate()
+        game.draw_level_frame(state)
+
+    def teardown():
+        game.levels, game.currentLevel = saved
+    return frame, teardown
+
+@benchmark("render/thumbnail/large-500x500")
+def setup_thumbnail():
+    level = {"layout": large_layout(500, 500, 10)}
+    return lambda: render_thumbnail(level)
+
+@benchmark("batch/evaluate_batch/2000-candidates", min_runs=3, warmup=1)
+def setup_batch():
+    # The shipped solutions with one tile moved at random, so about half of them fail
+    levels = presets.levels
+    for index in range(len(levels)):
+        if not solution(index):
+            raise RuntimeError(f"The solver found no solution for level {index + 1} to build candidates from")
+    rng = random.Random(0)
+    candidates = []
+    for _ in range(2000):
+        index = rng.randrange(len(levels))
+        cells = list(solution(index))
+        cells[rng.randrange(len(cells))] = (rng.randrange(16), rng.randrange(12))
+        candidates.append((index, cells))
+    return lambda: sum(1 for _ in evaluate_batch(candidates, levels=levels))
+
+def python_startup(code):
+    """Times a fresh interpreter running `code` from this directory, as a player's launch would."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    command = [sys.executable, "-c", code]
+    return lambda: subprocess.run(command, cwd=here, check=True,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+@benchmark("startup/import_presets", min_runs=5, warmup=1)
+def setup_import_presets():
+    return python_startup("import presets")
+
+@benchmark("startup/import_game", min_runs=5, warmup=1)
+def setup_import_game():
+    # Also checks that the import stayed free of side effects
+    return python_startup("import pygame, pathwaypaver; assert not pygame.display.get_init()")
+
+@benchmark("startup/first_frame", min_runs=5, warmup=1)
+def setup_first_frame():
+    return python_startup("import pathwaypaver as game; surface = game.init_display(); "
+                          "game.MainMenuScene().draw(surface)")
+
+# ================================
+# Measurement
+# ================================
+def percentile(ordered, fraction):
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def measure(fn, min_time=0.5, min_runs=20, warmup=3):
+    """Times `fn` until both `min_runs` and `min_time` are reached; returns a summary dict."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    started = time.perf_counter()
+    while len(samples) < min_runs or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    ordered = sorted(samples)
+    total = sum(samples)
+    return {
+        "runs": len(samples),
+        "ops_per_sec": len(samples) / total if total else float("inf"),
+        "mean_us": total / len(samples) * 1e6,
+        "p50_us": percentile(ordered, 0.50) * 1e6,
+        "p95_us": percentile(ordered, 0.95) * 1e6,
+        "p99_us": percentile(ordered, 0.99) * 1e6,
+    }
+
+def run(selected=None, min_time=0.5):
+    results = {}
+    for name, setup, options in BENCHMARKS:
+        if selected and not any(part in name for part in selected):
+            continue
+        fn = setup()
+        teardown = None
+        if isinstance(fn, tuple):
+            fn, teardown = fn
+        try:
+            results[name] = measure(fn, min_time=min_time, **options)
+        finally:
+            if teardown is not None:
+                teardown()
+        stats = results[name]
+        print(f"{name:48s} {stats['ops_per_sec']:12.1f}/s  p50 {stats['p50_us']:10.1f}us"
+              f"  p95 {stats['p95_us']:10.1f}us  p99 {stats['p99_us']:10.1f}us")
+    return results
+
+def compare(results, baseline, threshold):
+    """Names of benchmarks whose median latency regressed by more than `threshold`."""
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None or not before.get("p50_us"):
+            continue
+        ratio = stats["p50_us"] / before["p50_us"]
+        if ratio > 1.0 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Pathway Paver.")
+    parser.add_argument("names", nargs="*", help="Only run benchmarks whose name contains one of these")
+    parser.add_argument("--out", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Saved results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Seconds to spend per benchmark")
+    args = parser.parse_args(argv)
+
+    results = run(args.names, min_time=args.min_time)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x slower than baseline")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Live connectivity of the walkable cells (roads and houses) of a grid.
+
+Every walkable cell carries the label of its connected component, and each
+label keeps the set of its cells. Paving a cell joins the components around
+it by relabelling the smaller ones into the largest (union by size), which
+is amortized O(log n) per cell. Clearing a cell can split its component: a
+breadth-first search is started from each of its neighbours in lockstep,
+searches that meet are merged, and as soon as only one group of searches is
+still running the others have found every cell of their new components.
+Removing a tile from the middle of an open area therefore stops after a few
+steps, and cutting a road off only walks the piece that was cut off.
+"""
+from collections import deque
+
+from pathfinding import DIRECTIONS
+from tiles import WALKABLE
+
+NO_LABEL = -1
+
+class Connectivity:
+    def __init__(self, grid):
+        self.grid = grid
+        self.rows = len(grid)
+        self.cols = len(grid[0]) if self.rows > 0 else 0
+        self.label = [NO_LABEL] * (self.rows * self.cols)  # Component of each flat cell
+        self.members = {}  # label -> set of flat cells
+        self._next_label = 0
+        for y in range(self.rows):
+            for x in range(self.cols):
+                index = y * self.cols + x
+                if self.label[index] == NO_LABEL and grid[y][x] in WALKABLE:
+                    self._flood(index)
+
+    def _new_label(self):
+        label = self._next_label
+        self._next_label += 1
+        return label
+
+    def _neighbours(self, index):
+        cols, rows = self.cols, self.rows
+        y, x = divmod(index, cols)
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < cols and 0 <= ny < rows:
+                yield ny * cols + nx
+
+    def _flood(self, start):
+        label = self._new_label()
+        cells = {start}
+        self.label[start] = label
+        queue = deque([start])
+        while queue:
+            index = queue.popleft()
+            for neighbour in self._neighbours(index):
+                if self.label[neighbour] == NO_LABEL and self._walkable(neighbour):
+                    self.label[neighbour] = label
+                    cells.add(neighbour)
+                    queue.append(neighbour)
+        self.members[label] = cells
+
+    def _walkable(self, index):
+        y, x = divmod(index, self.cols)
+        return self.grid[y][x] in WALKABLE
+
+    # --------------------------------
+    # Queries
+    # --------------------------------
+    def component(self, x, y):
+        """Label of the component (x, y) is in, or NO_LABEL if it is not walkable."""
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return NO_LABEL
+        return self.label[y * self.cols + x]
+
+    def reaches(self, start, destination):
+        """Whether a car at `start` can drive to `destination`.
+
+        Like `DistanceField.path_from`, the start cell itself need not be
+        walkable; one of its neighbours must share the destination's component.
+        """
+        if destination is None:
+            return False
+        if start == destination:
+            return True
+        target = self.component(*destination)
+        if target == NO_LABEL:
+            return False
+        return any(self.component(start[0] + dx, start[1] + dy) == target for dx, dy in DIRECTIONS)
+
+    # --------------------------------
+    # Updates
+    # --------------------------------
+    def cell_changed(self, x, y):
+        """Updates the components after grid[y][x] was paved or cleared."""
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return
+        index = y * self.cols + x
+        if self._walkable(index):
+            if self.label[index] == NO_LABEL:
+                self._add(index)
+        elif self.label[index] != NO_LABEL:
+            self._remove(index)
+
+    def _add(self, index):
+        labels = {self.label[n] for n in self._neighbours(index)} - {NO_LABEL}
+        if not labels:
+            label = self._new_label()
+            self.label[index] = label
+            self.members[label] = {index}
+            return
+        # Keep the biggest component's label and move the others' cells into it
+        keep = max(labels, key=lambda l: len(self.members[l]))
+        cells = self.members[keep]
+        for other in labels - {keep}:
+            for cell in self.members.pop(other):
+                self.label[cell] = keep
+                cells.add(cell)
+        self.label[index] = keep
+        cells.add(index)
+
+    def _remove(self, index):
+        label = self.label[index]
+        self.label[index] = NO_LABEL
+        cells = self.members[label]
+        cells.discard(index)
+        if not cells:
+            del self.members[label]
+            return
+        seeds = [n for n in self._neighbours(index) if self.label[n] == label]
+        if len(seeds) < 2:
+            return  # A dead end: nothing can have been cut off
+
+        # One search per seed, run in lockstep; searches that meet join a group
+        group = list(range(len(seeds)))
+
+        def find(search):
+            while group[search] != search:
+                group[search] = group[group[search]]
+                search = group[search]
+            return search
+
+        owner = {}
+        queues = []
+        for search, seed in enumerate(seeds):
+            owner[seed] = search
+            queues.append(deque([seed]))
+        running = set(range(len(seeds)))  # Groups whose searches have not all finished
+        while len(running) > 1:
+            for search, queue in enumerate(queues):
+                if not queue:
+                    continue
+                current = queue.popleft()
+                for neighbour in self._neighbours(current):
+                    if self.label[neighbour] != label:
+                        continue
+                    other = owner.get(neighbour)
+                    if other is None:
+                        owner[neighbour] = search
+                        queue.append(neighbour)
+                    else:
+                        a, b = find(search), find(other)
+                        if a != b:
+                            group[b] = a
+                            running.discard(b)
+                            running.add(a)
+            # A group with no cells left to visit has found its whole component
+            for root in list(running):
+                if len(running) == 1:
+                    break
+                if all(not queues[s] for s in range(len(seeds)) if find(s) == root):
+                    running.discard(root)
+                    self._split_off([c for c, s in owner.items() if find(s) == root], label)
+
+    def _split_off(self, component, old_label):
+        label = self._new_label()
+        for cell in component:
+            self.label[cell] = label
+        self.members[label] = set(component)
+        self.members[old_label].difference_update(component)
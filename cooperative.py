@@ -0,0 +1,165 @@
+"""Cooperative space-time planning for Pathway Paver.
+
+By default each car drives its own shortest path, and at move time simply
+waits whenever its next cell is taken, so cars queue behind each other and
+burn turns. The cooperative planner plans cars one at a time in id order
+against a shared reservation table of (x, y, t) cells instead. Later cars
+route or wait around earlier ones before anybody moves, and the schedules it
+returns are conflict-free under the game's move rules, unless a car ends up
+boxed in and has to hold a cell an earlier car planned to drive through
+(the turn engine then makes the earlier car wait, as it always does).
+
+It is windowed hierarchical cooperative A* (WHCA*): each car searches
+space-time only `window` turns ahead, guided by the exact distance fields
+from `pathfinding` as its abstract heuristic. The first `window // 2` turns of
+every plan are committed, then all cars plan again from there.
+
+    sim = Simulation.from_level(level, placements, planner=CooperativePlanner())
+"""
+import heapq
+
+from pathfinding import DIRECTIONS, UNREACHABLE
+from tiles import WALKABLE
+
+class ReservationTable:
+    """Which car holds each cell (flat index) at each turn."""
+
+    def __init__(self):
+        self.held = {}  # (cell, t) -> slot
+
+    def reserve(self, cell, t, slot):
+        """Reserves the cell unless an earlier (higher-priority) car already holds it."""
+        self.held.setdefault((cell, t), slot)
+
+    def is_free(self, cell, t, slot):
+        """Whether `slot` may be on `cell` at turn t.
+
+        A cell a car was on at turn t is still blocked for anyone moving onto it
+        at t + 1, so no other car may be there one turn either side of t.
+        """
+        held = self.held
+        for when in (t - 1, t, t + 1):
+            holder = held.get((cell, when))
+            if holder is not None and holder != slot:
+                return False
+        return True
+
+    def clear(self):
+        self.held.clear()
+
+class CooperativePlanner:
+    """Callable planner for `Simulation(..., planner=...)`; returns one path per car slot.
+
+    Paths may repeat a cell, which means the car waits there for a turn.
+    """
+
+    def __init__(self, window=16):
+        if window < 2:
+            raise ValueError("The window must be at least 2 turns")
+        self.window = window
+        self.nodes = 0  # Space-time states expanded by the last plan
+
+    def __call__(self, sim):
+        cols = sim.cols
+        walkable = bytearray(1 if tile in WALKABLE else 0 for row in sim.grid for tile in row)
+        cars = sim.by_slot
+        positions = [car.y * cols + car.x for car in cars]
+        goals = [None] * len(cars)
+        fields = [None] * len(cars)
+        paths = [[] for _ in cars]
+        active = []
+        for slot, car in enumerate(cars):
+            if car.destination is None:
+                continue
+            field = sim.fields.field(car.destination)
+            if field.first_step((car.x, car.y)) is None:
+                continue  # No route at all; the car fails its first turn like an unplanned one
+            fields[slot] = field.dist
+            goals[slot] = car.destination[1] * cols + car.destination[0]
+            active.append(slot)
+        driving = set(active)
+
+        self.nodes = 0
+        table = ReservationTable()
+        commit = self.window // 2
+        t0 = 0
+        while active and t0 <= sim.max_turns:
+            # Every car holds its current cell at the start of the round
+            table.clear()
+            for slot in range(len(cars)):
+                if slot in driving or not paths[slot]:
+                    table.reserve(positions[slot], t0, slot)
+            still_active = []
+            for slot in active:
+                plan = self._plan_window(slot, positions[slot], goals[slot], fields[slot],
+                                         t0, walkable, cols, len(sim.grid), table)
+                if plan is None:
+                    # Boxed in by earlier cars' plans: hold the cell and try again next round
+                    plan = [positions[slot]] * (commit + 1)
+                for t, cell in enumerate(plan[1:], start=t0 + 1):
+                    table.reserve(cell, t, slot)
+                steps = plan[1:commit + 1]
+                paths[slot].extend(steps)
+                positions[slot] = steps[-1]
+                if steps[-1] != goals[slot]:
+                    still_active.append(slot)
+            active = still_active
+            driving = set(active)
+            t0 += commit
+
+        return [[(cell % cols, cell // cols) for cell in path] for path in paths]
+
+    def _plan_window(self, slot, start, goal, dist, t0, walkable, cols, rows, table):
+        """Space-time A* from `start` at turn t0, up to `window` turns ahead.
+
+        Returns the cells held at turns t0, t0 + 1, ..., ending on the goal or
+        at the window's horizon, or None if the car cannot even wait.
+        """
+        horizon = t0 + self.window
+
+        def h(cell):
+            if dist[cell] != UNREACHABLE:
+                return dist[cell]
+            # A car's starting cell is not walkable; it is one step from its best neighbour
+            best = [dist[n] + 1 for n in neighbours(cell) if dist[n] != UNREACHABLE]
+            return min(best) if best else None
+
+        def neighbours(cell):
+            y, x = divmod(cell, cols)
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < cols and 0 <= ny < rows:
+                    yield ny * cols + nx
+
+        start_h = h(start)
+        if start_h is None:
+            return None
+        came_from = {(start, t0): None}
+        order = 0
+        heap = [(start_h, start_h, order, start, t0)]
+        while heap:
+            _, _, _, cell, t = heapq.heappop(heap)
+            self.nodes += 1
+            if cell == goal or t == horizon:
+                plan = []
+                key = (cell, t)
+                while key is not None:
+                    plan.append(key[0])
+                    key = came_from[key]
+                plan.reverse()
+                return plan
+            options = [cell] + [n for n in neighbours(cell) if walkable[n] and dist[n] != UNREACHABLE]
+            for nxt in options:
+                key = (nxt, t + 1)
+                if key in came_from or not table.is_free(nxt, t + 1, slot):
+                    continue
+                came_from[key] = (cell, t)
+                order += 1
+                remaining = h(nxt)
+                g = t + 1 - t0
+                heapq.heappush(heap, (g + remaining, remaining, order, nxt, t + 1))
+        return None
+
+def plan_cooperative(sim, window=16):
+    """Conflict-free paths for every car of `sim`, in slot (id) order."""
+    return CooperativePlanner(window)(sim)
@@ -0,0 +1,159 @@
+"""Procedural level generator for Pathway Paver.
+
+Random layouts of trees, cars (80-89) and houses (90-99) are solved headlessly
+with `solver.solve`; only layouts with a verified solution are kept. Their
+`max_tiles`/`max_turns` are then set from the solution to hit a difficulty
+target: 1.0 leaves no slack at all, 0.0 allows 50% more than needed.
+
+Generation fans out over a ProcessPoolExecutor:
+
+    python generator.py --count 1000 --cars 3 --difficulty 0.8 --out pack.json
+    python generator.py --count 100000 --out levels.pack --pack
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from levelpack import write_pack
+from simulation import SUCCESS, Simulation
+from solver import SOLVED, solve
+from tiles import COLOR_COUNT, EMPTY, TREE
+
+def random_layout(rng, cols=16, rows=12, cars=2, tree_density=0.1):
+    """A random layout with `cars` car/house pairs and scattered trees.
+
+    Cars drive to the first house of their colour, so a layout has at most
+    one pair per colour; a fifth car would share the first car's house.
+    """
+    if not 1 <= cars <= COLOR_COUNT:
+        raise ValueError(f"A layout holds between 1 and {COLOR_COUNT} cars, one per colour")
+    layout = [[TREE if rng.random() < tree_density else EMPTY for _ in range(cols)] for _ in range(rows)]
+    cells = rng.sample([(x, y) for y in range(rows) for x in range(cols)], 2 * cars)
+    for car_id in range(cars):
+        (cx, cy), (hx, hy) = cells[2 * car_id], cells[2 * car_id + 1]
+        layout[cy][cx] = 80 + car_id
+        layout[hy][hx] = 90 + car_id
+    return layout
+
+def with_slack(value, difficulty):
+    return value + round((1.0 - difficulty) * 0.5 * value)
+
+def generate_level(seed, cols=16, rows=12, cars=2, tree_density=0.1, difficulty=0.5, node_limit=100000):
+    """Builds one verified level from `seed`, or returns None if the layout was rejected.
+
+    Layouts the solver cannot settle within `node_limit` search nodes are
+    rejected; a node budget rather than a time limit keeps runs reproducible.
+    """
+    if not 0.0 <= difficulty <= 1.0:
+        raise ValueError("Difficulty must be between 0 and 1")
+    rng = random.Random(seed)
+    layout = random_layout(rng, cols, rows, cars, tree_density)
+    # Solve with loose limits first, then tighten them around the solution found
+    loose = {"layout": layout, "max_tiles": cols * rows, "max_turns": 2 * (cols + rows)}
+    result = solve(loose, node_limit=node_limit)
+    if result.status != SOLVED or result.tiles == 0:
+        return None
+    level = {
+        "name": f"Generated {seed}",
+        "layout": layout,
+        "max_tiles": with_slack(result.tiles, difficulty),
+        "max_turns": with_slack(result.turns_used, difficulty),
+        "min_tiles": result.tiles,
+        "solution": [list(cell) for cell in result.placements],
+    }
+    # The stored solution must still win under the tightened limits
+    if Simulation.from_level(level, placements=result.placements).run() != SUCCESS:
+        return None
+    return level
+
+def _generate(args):
+    seed, options = args
+    return generate_level(seed, **options)
+
+def generate_levels(count, seed=0, workers=None, max_attempts=None, **options):
+    """Yields `count` verified levels, generated in parallel worker processes.
+
+    Candidate seeds start at `seed` and levels are yielded in seed order, so a
+    run is reproducible for a given set of options regardless of `workers`.
+    Raises RuntimeError if `max_attempts` seeds (by default 100 per level, at
+    least 1000) are tried without producing `count` levels.
+    """
+    workers = workers or os.cpu_count() or 1
+    if max_attempts is None:
+        max_attempts = max(1000, 100 * count)
+    produced = 0
+    next_seed = seed      # Next seed to hand to a worker
+    next_yield = seed     # Next seed whose result may be yielded
+    finished = {}         # seed -> level or None, waiting for earlier seeds
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        while produced < count:
+            # A slow seed holds back the ones after it; they count until yielded
+            while len(pending) + len(finished) < 2 * workers and next_seed - seed < max_attempts:
+                pending[executor.submit(_generate, (next_seed, options))] = next_seed
+                next_seed += 1
+            if not pending:
+                raise RuntimeError(f"Only {produced} of {count} levels passed in {max_attempts} seeds; "
+                                   f"try fewer trees or cars, or a larger node limit")
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finished[pending.pop(future)] = future.result()
+            while next_yield in finished and produced < count:
+                level = finished.pop(next_yield)
+                next_yield += 1
+                if level is not None:
+                    produced += 1
+                    yield level
+        for future in pending:
+            future.cancel()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate solvable Pathway Paver levels.")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cols", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=12)
+    parser.add_argument("--cars", type=int, default=2, help=f"Car/house pairs, 1-{COLOR_COUNT}")
+    parser.add_argument("--trees", type=float, default=0.1, help="Tree density, 0-1")
+    parser.add_argument("--difficulty", type=float, default=0.5, help="0 = generous limits, 1 = no slack")
+    parser.add_argument("--node-limit", type=int, default=100000, help="Solver nodes per candidate")
+    parser.add_argument("--max-attempts", type=int, default=None,
+                        help="Seeds to try before giving up (default: 100 per level, at least 1000)")
+    parser.add_argument("--out", default=None, help="JSON file to write (default: stdout)")
+    parser.add_argument("--pack", action="store_true", help="Write a binary level pack (see levelpack.py) to --out")
+    args = parser.parse_args(argv)
+    if args.pack and not args.out:
+        parser.error("--pack needs --out")
+    if not 0.0 <= args.difficulty <= 1.0:
+        parser.error("--difficulty must be between 0 and 1")
+    if not 1 <= args.cars <= COLOR_COUNT:
+        parser.error(f"--cars must be between 1 and {COLOR_COUNT}, one per colour")
+
+    options = {"cols": args.cols, "rows": args.rows, "cars": args.cars, "tree_density": args.trees,
+               "difficulty": args.difficulty, "node_limit": args.node_limit}
+    levels = generate_levels(args.count, seed=args.seed, workers=args.workers,
+                             max_attempts=args.max_attempts, **options)
+    levels = (dict(level, name=f"Level {index + 1}") for index, level in enumerate(levels))
+    try:
+        if args.pack:
+            # Records are streamed to the file, so large packs never sit in memory
+            write_pack(levels, args.out)
+            return
+        levels = list(levels)
+    except RuntimeError as error:
+        if args.pack and os.path.exists(args.out):
+            os.remove(args.out)  # Half-written, with no index
+        sys.exit(f"generator.py: {error}")
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        json.dump(levels, out)
+    finally:
+        if args.out:
+            out.close()
+
+if __name__ == "__main__":
+    main()
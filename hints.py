@@ -0,0 +1,198 @@
+"""Hints: the next road tile toward a minimum-tile solution, worked out between frames.
+
+The solver can take seconds on a hard level, and the game must keep drawing
+at 60 FPS meanwhile. A hint search therefore runs on its own thread, but
+only while the game lends it a slice: `HintEngine.run_slice(seconds)` wakes
+the search and waits for it to park again, which it does at the first solver
+node or pause point (flood fills and test plays pause every few hundred
+cells or every turn) after the slice is used up. The search never competes
+with drawing for the interpreter, and the frame budget decides how much work
+a frame carries.
+
+The search is anytime. It first spends a few thousand nodes looking depth
+first for any road set within the level's tile and turn limits that the
+game plays to a success, so a hint is usually ready within a second even on
+levels where proving the minimum takes several; the IDA* search then
+replaces it with a minimal one. Changing the grid cancels the search, unless
+the roads are still a subset of the minimal answer, which stays minimal.
+
+    engine = HintEngine(level)
+    engine.toggled((3, 2), True)  # the player paved (3, 2)
+    engine.request()
+    while engine.searching:
+        engine.run_slice(0.006)   # once per frame
+    print(engine.hint())          # ("place", (x, y)), ("remove", (x, y)) or None
+"""
+import threading
+import time
+
+from solver import SOLVED, UNSOLVABLE, Solver, SolveTimeout
+
+IDLE = "idle"
+SEARCHING = "searching"
+FOUND = "found"
+NO_SOLUTION = "no solution"
+
+LATE_PARK = 0.002  # Seconds a frame waits past its slice for the search to park
+
+class _SlicedSolver(Solver):
+    def __init__(self, level, roads, search):
+        self.search = search  # Set first: setting up the solver already pauses
+        super().__init__(level, roads=roads)
+
+    def _tick(self):
+        super()._tick()
+        self.search.checkpoint()
+
+    def _pause(self):
+        self.search.checkpoint()
+
+class _Search:
+    """One hint search on its own thread, which only runs while the game lends it a slice."""
+
+    def __init__(self, level, roads):
+        self.level = level
+        self.roads = frozenset(roads)
+        self.cancelled = False
+        self.done = False
+        self.status = SEARCHING
+        self.target = None      # Every road of the best solution found so far
+        self.optimal = False
+        self.slice_end = 0.0
+        self.granted = False    # Lent a slice it has not handed back yet
+        self._resume = threading.Semaphore(0)
+        self._parked = threading.Semaphore(0)
+        self.thread = threading.Thread(target=self._run, name="hint-search", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        self._resume.acquire()
+        try:
+            self._solve()
+        except SolveTimeout:
+            pass
+        finally:
+            self.done = True
+            self._parked.release()
+
+    def _solve(self):
+        self.checkpoint()
+        solver = _SlicedSolver(self.level, self.roads, self)
+        quick = solver.first_roads()
+        if quick is not None:
+            self.target = self.roads.union(quick)
+        result = solver.solve()
+        if result.status == SOLVED:
+            self.target = self.roads.union(result.placements)
+            self.optimal = True
+        elif result.status == UNSOLVABLE and self.roads:
+            # Adding tiles cannot save these roads; look for a solution from an empty grid
+            result = _SlicedSolver(self.level, (), self).solve()
+            if result.status == SOLVED:
+                self.target = frozenset(result.placements)
+                self.optimal = True
+        if self.cancelled:
+            return
+        self.status = FOUND if self.target is not None else NO_SOLUTION
+
+    def checkpoint(self):
+        """Called by the solver at every node: parks the thread once the slice is used up."""
+        if self.cancelled:
+            raise SolveTimeout()
+        if time.perf_counter() >= self.slice_end:
+            self._parked.release()
+            self._resume.acquire()
+            if self.cancelled:
+                raise SolveTimeout()
+
+    def run_slice(self, seconds):
+        if self.done:
+            return
+        if not self.granted:
+            self.slice_end = time.perf_counter() + seconds
+            self.granted = True
+            self._resume.release()
+        # A slow solver node can overrun the slice; the frame then goes on without it
+        if self._parked.acquire(timeout=seconds + LATE_PARK):
+            self.granted = False
+
+    def cancel(self):
+        self.cancelled = True
+        if not self.done:
+            self._resume.release()  # A parked search wakes up only to stop
+
+class HintEngine:
+    def __init__(self, level, roads=()):
+        self.level = level
+        self.roads = set(roads)  # Cells the player has paved
+        self.status = IDLE
+        self.target = None   # Roads of the best solution found so far, or None
+        self.optimal = False
+        self._search = None
+
+    @property
+    def searching(self):
+        return self._search is not None
+
+    def request(self):
+        """Starts a search from the paved cells unless one is running or a minimal answer still holds."""
+        if self._search is not None or (self.optimal and self.roads <= self.target):
+            return
+        self._search = _Search(self.level, self.roads)
+        self.status = SEARCHING
+
+    def toggled(self, cell, paved):
+        """The player paved or cleared `cell`; drops answers that no longer fit."""
+        if paved:
+            self.roads.add(cell)
+        else:
+            self.roads.discard(cell)
+        if self.optimal and self.roads <= self.target:
+            return
+        self.cancel()
+        self.target = None
+        self.optimal = False
+        self.status = IDLE
+
+    def run_slice(self, seconds):
+        """Lends the search up to `seconds`; returns True if the best answer changed."""
+        search = self._search
+        if search is None:
+            return False
+        search.run_slice(seconds)
+        changed = search.target != self.target
+        self.target = search.target
+        self.optimal = search.optimal
+        if search.done:
+            self.status = search.status
+            self._search = None
+            changed = True
+        return changed
+
+    def cancel(self):
+        if self._search is not None:
+            self._search.cancel()
+            self._search = None
+        if self.status == SEARCHING:
+            self.status = IDLE
+
+    def hint(self):
+        """("place", cell) or ("remove", cell) toward the best answer so far, or None."""
+        if self.target is None:
+            return None
+        roads = self.roads
+        missing = sorted(self.target - roads)
+        if missing:
+            # Prefer a tile that grows a road the player already has
+            for cell in missing:
+                if any(n in roads for n in _neighbours(cell)):
+                    return "place", cell
+            return "place", missing[0]
+        extra = sorted(roads - self.target)
+        if extra:
+            return "remove", extra[0]
+        return None
+
+def _neighbours(cell):
+    x, y = cell
+    return ((x + 1, y), (x, y + 1), (x - 1, y), (x, y - 1))
@@ -0,0 +1,208 @@
+"""Binary level packs for Pathway Paver.
+
+A pack is one file holding any number of levels, opened with `mmap` so that
+nothing but the header is read up front; a level is decoded only when it is
+asked for. Layout:
+
+    header   magic b"PPLP", version, level count, offset of the index
+    records  one per level, back to back (see `RECORD`)
+    index    one little-endian uint64 record offset per level
+
+Each record stores the grid as one byte per tile (row-major, tile codes as in
+`tiles.py`) and the car and destination cells already pulled out of it, so
+neither the game nor the simulation has to scan the grid for them.
+
+    python levelpack.py levels.json levels.pack   # Convert generator.py output
+    python levelpack.py --info levels.pack
+"""
+import argparse
+import json
+import mmap
+import struct
+import sys
+from collections import OrderedDict
+
+from tiles import CAR_TILES, DEST_TILES
+
+MAGIC = b"PPLP"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIQ")  # magic, version, unused, level count, index offset
+# cols, rows, max_tiles, max_turns, min_tiles (-1 if unknown), name length,
+# car tiles, destination tiles, extra cars, solution cells
+RECORD = struct.Struct("<HHiiiHHHHH")
+CELL_ID = struct.Struct("<HHH")     # x, y, id of a car or destination tile
+EXTRA_CAR = struct.Struct("<HHHH")  # start x, start y, destination x, destination y
+CELL = struct.Struct("<HH")
+
+# ================================
+# Writing
+# ================================
+def encode_level(level):
+    """Packs one entry of `levels` into a record."""
+    layout = level["layout"]
+    rows, cols = len(layout), len(layout[0])
+    tiles = bytes(layout[y][x] for y in range(rows) for x in range(cols))
+    car_tiles, dest_tiles = [], []
+    for index, tile in enumerate(tiles):
+        if tile in CAR_TILES:
+            car_tiles.append((index % cols, index // cols, tile - 80))
+        elif tile in DEST_TILES:
+            dest_tiles.append((index % cols, index // cols, tile - 90))
+    name = level["name"].encode("utf-8")
+    extra_cars = level.get("cars", ())
+    solution = level.get("solution", ())
+    min_tiles = level.get("min_tiles")
+    parts = [RECORD.pack(cols, rows, level["max_tiles"], level["max_turns"],
+                         -1 if min_tiles is None else min_tiles, len(name),
+                         len(car_tiles), len(dest_tiles), len(extra_cars), len(solution)),
+             name, tiles]
+    parts += [CELL_ID.pack(*entry) for entry in car_tiles + dest_tiles]
+    parts += [EXTRA_CAR.pack(*entry) for entry in extra_cars]
+    parts += [CELL.pack(*cell) for cell in solution]
+    return b"".join(parts)
+
+def write_pack(levels, path):
+    """Writes an iterable of levels to `path` one record at a time. Returns the level count."""
+    offsets = []
+    with open(path, "wb") as out:
+        out.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        for level in levels:
+            offsets.append(out.tell())
+            out.write(encode_level(level))
+        index_offset = out.tell()
+        out.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, 0, len(offsets), index_offset))
+    return len(offsets)
+
+# ================================
+# Reading
+# ================================
+class LevelPack:
+    """Read-only, lazily decoded sequence of the levels in a pack file.
+
+    Indexing returns a dict shaped like an entry of `levels`, plus the
+    precomputed "car_tiles" and "dest_tiles" lists of (x, y, id). The last
+    `cache_size` decoded levels are kept, since the game looks its current
+    level up every frame.
+    """
+
+    def __init__(self, path, cache_size=8):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is not a level pack") from None
+        magic, version, _, count, index_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a level pack")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is a version {version} level pack; version {VERSION} is supported")
+        self._count = count
+        self._index_offset = index_offset
+        # Record offsets are read straight out of the mapping
+        self._index = memoryview(self._map)[index_offset:index_offset + 8 * count].cast("Q")
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("level index out of range")
+        level = self._cache.get(index)
+        if level is not None:
+            self._cache.move_to_end(index)
+            return level
+        level = self._decode(self._index[index])
+        self._cache[index] = level
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return level
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def name(self, index):
+        """The level's name, without decoding its grid."""
+        offset = self._index[index]
+        name_length = RECORD.unpack_from(self._map, offset)[5]
+        start = offset + RECORD.size
+        return self._map[start:start + name_length].decode("utf-8")
+
+    def _decode(self, offset):
+        data = self._map
+        (cols, rows, max_tiles, max_turns, min_tiles, name_length,
+         car_count, dest_count, extra_count, solution_count) = RECORD.unpack_from(data, offset)
+        at = offset + RECORD.size
+        name = data[at:at + name_length].decode("utf-8")
+        at += name_length
+        tiles = data[at:at + cols * rows]
+        at += cols * rows
+        objects = [CELL_ID.unpack_from(data, at + i * CELL_ID.size) for i in range(car_count + dest_count)]
+        at += (car_count + dest_count) * CELL_ID.size
+        extra_cars = [EXTRA_CAR.unpack_from(data, at + i * EXTRA_CAR.size) for i in range(extra_count)]
+        at += extra_count * EXTRA_CAR.size
+        solution = [CELL.unpack_from(data, at + i * CELL.size) for i in range(solution_count)]
+        level = {
+            "name": name,
+            "layout": [list(tiles[y * cols:(y + 1) * cols]) for y in range(rows)],
+            "max_tiles": max_tiles,
+            "max_turns": max_turns,
+            "car_tiles": objects[:car_count],
+            "dest_tiles": objects[car_count:],
+        }
+        if extra_cars:
+            level["cars"] = extra_cars
+        if min_tiles >= 0:
+            level["min_tiles"] = min_tiles
+        if solution:
+            level["solution"] = solution
+        return level
+
+    def close(self):
+        if getattr(self, "_index", None) is not None:
+            self._index.release()
+            self._index = None
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a JSON level list to a Pathway Paver level pack.")
+    parser.add_argument("source", help="JSON list of levels (as written by generator.py), or a pack with --info")
+    parser.add_argument("out", nargs="?", help="Pack file to write")
+    parser.add_argument("--info", action="store_true", help="List the levels in a pack")
+    args = parser.parse_args(argv)
+
+    if args.info:
+        with LevelPack(args.source) as pack:
+            print(f"{len(pack)} levels")
+            for index in range(min(len(pack), 20)):
+                print(f"{index + 1:>6}  {pack.name(index)}")
+        return 0
+    if args.out is None:
+        parser.error("an output pack file is required")
+    with open(args.source) as source:
+        count = write_pack(json.load(source), args.out)
+    print(f"Wrote {count} levels to {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
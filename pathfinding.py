@@ -0,0 +1,390 @@
+"""Shared shortest-path fields for Pathway Paver.
+
+Instead of running one BFS per car, a single reverse BFS is run from each
+destination. Every reachable cell records its distance to the destination and
+a pointer to the next cell on a shortest route, so any number of cars heading
+to the same house read their paths off one field.
+
+Fields are also kept up to date as single tiles are placed or removed: only
+the cells whose distance actually changes are touched, in the spirit of
+LPA*/D* Lite, which keeps a live route preview cheap on large grids.
+
+Grids are identified by a Zobrist hash that a tile toggle updates in O(1),
+and fields and paths are memoized on it in size-bounded LRUs shared by every
+`FieldCache` in the process. A grid seen before (a restarted level, a road
+set the solver already tried) skips the BFS entirely.
+"""
+import heapq
+from collections import OrderedDict, deque
+
+from tiles import WALKABLE
+
+# Neighbour order used everywhere ties between equally short routes are broken
+DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+UNREACHABLE = -1
+
+# ================================
+# Grid hashing and memos
+# ================================
+MASK64 = (1 << 64) - 1
+
+def zobrist_key(index, tile):
+    """64-bit key for `tile` on flat cell `index` (splitmix64, so no table is stored).
+
+    Empty cells (tile 0) key to 0, so hashing a grid only visits its other tiles;
+    the grid's size is part of `GridHash.key()` instead.
+    """
+    if tile == 0:
+        return 0
+    z = ((index << 8) | tile) * 0x9E3779B97F4A7C15 & MASK64
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & MASK64
+    return z ^ (z >> 31)
+
+class GridHash:
+    """Zobrist hash of a grid's tiles, kept current by `update` on each toggle.
+
+    The full scan is put off until the hash is first asked for, so grids that
+    never look up a memo do not pay for it.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.rows = len(grid)
+        self.cols = len(grid[0]) if self.rows > 0 else 0
+        self.value = None
+
+    def _scan(self):
+        value = 0
+        for y, row in enumerate(self.grid):
+            base = y * self.cols
+            for x, tile in enumerate(row):
+                if tile:
+                    value ^= zobrist_key(base + x, tile)
+        return value
+
+    def update(self, x, y, old_tile, new_tile):
+        if self.value is not None:
+            index = y * self.cols + x
+            self.value ^= zobrist_key(index, old_tile) ^ zobrist_key(index, new_tile)
+
+    def key(self):
+        if self.value is None:
+            self.value = self._scan()
+        return (self.cols, self.rows, self.value)
+
+class Memo:
+    """Size-bounded LRU mapping with hit and miss counts.
+
+    Entries are evicted oldest first once there are more than `max_entries`
+    of them, or once their summed `cost` passes `max_cost`.
+    """
+
+    def __init__(self, max_entries, max_cost=None):
+        self.max_entries = max_entries
+        self.max_cost = max_cost
+        self.entries = OrderedDict()  # key -> (value, cost)
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, cost=1):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.cost -= old[1]
+        self.entries[key] = (value, cost)
+        self.cost += cost
+        while len(self.entries) > self.max_entries or (self.max_cost is not None and self.cost > self.max_cost):
+            _, (_, evicted_cost) = self.entries.popitem(last=False)
+            self.cost -= evicted_cost
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        self.entries.clear()
+        self.cost = 0
+        self.hits = 0
+        self.misses = 0
+
+# Shared by every FieldCache. A field snapshot holds two lists the size of the
+# grid, so that memo is bounded by cells stored as well as by entries
+field_memo = Memo(256, max_cost=2000000)  # (grid key, destination) -> (dist, next_hop)
+path_memo = Memo(65536)   # (grid key, start, destination) -> path tuple
+
+def memo_stats():
+    """Hit rates and sizes of the shared memos, e.g. for the profiler overlay."""
+    return {name: {"hits": memo.hits, "misses": memo.misses, "hit_rate": memo.hit_rate,
+                   "entries": len(memo.entries)}
+            for name, memo in (("fields", field_memo), ("paths", path_memo))}
+
+# ================================
+# Distance fields
+# ================================
+class DistanceField:
+    """Distances from every cell to `destination` over walkable cells.
+
+    `next_hop` always points at the first neighbour (in DIRECTIONS order) that
+    is one step closer, so routes only depend on the distances and a field
+    updated incrementally gives the same routes as one built from scratch.
+    """
+
+    def __init__(self, grid, destination, snapshot=None):
+        self.grid = grid
+        self.destination = destination
+        self.rows = len(grid)
+        self.cols = len(grid[0]) if self.rows > 0 else 0
+        if snapshot is not None:
+            # Restored from `snapshot()` of a field on an identical grid
+            self.dist, self.next_hop = list(snapshot[0]), list(snapshot[1])
+            return
+        size = self.rows * self.cols
+        self.dist = [UNREACHABLE] * size      # Steps to the destination, flat row-major
+        self.next_hop = [UNREACHABLE] * size  # Flat index of the next cell toward it
+        if destination is not None and 0 <= destination[0] < self.cols and 0 <= destination[1] < self.rows:
+            self._build(grid)
+
+    def snapshot(self):
+        """A copy of the field's arrays, unaffected by later incremental updates."""
+        return list(self.dist), list(self.next_hop)
+
+    def _build(self, grid):
+        cols, rows = self.cols, self.rows
+        dist, next_hop = self.dist, self.next_hop
+        dx0, dy0 = self.destination
+        origin = dy0 * cols + dx0
+        dist[origin] = 0
+        queue = deque([origin])
+        while queue:
+            index = queue.popleft()
+            # Every cell one step closer is settled before this one is popped
+            if index != origin:
+                next_hop[index] = self._best_hop(index)
+            y, x = divmod(index, cols)
+            step = dist[index] + 1
+            for dx, dy in DIRECTIONS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < cols and 0 <= ny < rows:
+                    neighbour = ny * cols + nx
+                    if dist[neighbour] == UNREACHABLE and grid[ny][nx] in WALKABLE:
+                        dist[neighbour] = step
+                        queue.append(neighbour)
+
+    def _neighbours(self, index):
+        cols, rows = self.cols, self.rows
+        y, x = divmod(index, cols)
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < cols and 0 <= ny < rows:
+                yield ny * cols + nx
+
+    def _best_hop(self, index):
+        """First neighbour one step closer to the destination."""
+        wanted = self.dist[index] - 1
+        for neighbour in self._neighbours(index):
+            if self.dist[neighbour] == wanted:
+                return neighbour
+        return UNREACHABLE
+
+    def _walkable(self, index):
+        y, x = divmod(index, self.cols)
+        return self.grid[y][x] in WALKABLE
+
+    def distance(self, x, y):
+        """Steps from (x, y) to the destination, or UNREACHABLE."""
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return UNREACHABLE
+        return self.dist[y * self.cols + x]
+
+    def first_step(self, start):
+        """The neighbour a car at `start` should drive onto first, or None."""
+        best = None
+        best_dist = UNREACHABLE
+        for dx, dy in DIRECTIONS:
+            d = self.distance(start[0] + dx, start[1] + dy)
+            if d != UNREACHABLE and (best is None or d < best_dist):
+                best = (start[0] + dx, start[1] + dy)
+                best_dist = d
+        return best
+
+    def path_from(self, start):
+        """Cells a car at `start` drives through, ending on the destination.
+
+        The start cell itself does not need to be walkable (cars start on their
+        own tile), so the first step is picked among its neighbours.
+        """
+        if start == self.destination:
+            return [start]
+        first = self.first_step(start)
+        if first is None:
+            return []
+        cols = self.cols
+        path = [first]
+        index = first[1] * cols + first[0]
+        while self.dist[index] > 0:
+            index = self.next_hop[index]
+            y, x = divmod(index, cols)
+            path.append((x, y))
+        return path
+
+    # --------------------------------
+    # Incremental updates
+    # --------------------------------
+    def cell_changed(self, x, y):
+        """Repairs the field after grid[y][x] was paved or cleared.
+
+        Returns the number of cells whose distance changed.
+        """
+        if self.destination is None or not (0 <= x < self.cols and 0 <= y < self.rows):
+            return 0
+        index = y * self.cols + x
+        if index == self.destination[1] * self.cols + self.destination[0]:
+            return 0
+        if self._walkable(index):
+            changed = self._cell_opened(index)
+        else:
+            changed = self._cell_closed(index)
+        self._refresh_hops(changed)
+        return len(changed)
+
+    def _cell_opened(self, index):
+        """A new walkable cell can only shorten routes: spread the decrease outward."""
+        dist = self.dist
+        best = UNREACHABLE
+        for neighbour in self._neighbours(index):
+            d = dist[neighbour]
+            if d != UNREACHABLE and (best == UNREACHABLE or d + 1 < best):
+                best = d + 1
+        if best == UNREACHABLE or (dist[index] != UNREACHABLE and dist[index] <= best):
+            return []
+        dist[index] = best
+        changed = [index]
+        queue = deque([index])
+        while queue:
+            current = queue.popleft()
+            step = dist[current] + 1
+            for neighbour in self._neighbours(current):
+                d = dist[neighbour]
+                if (d == UNREACHABLE or d > step) and self._walkable(neighbour):
+                    dist[neighbour] = step
+                    changed.append(neighbour)
+                    queue.append(neighbour)
+        return changed
+
+    def _cell_closed(self, index):
+        """A removed cell can only lengthen routes that ran through it.
+
+        Those cells are exactly its subtree along next_hop. They are cleared and
+        re-settled from the untouched cells bordering them.
+        """
+        dist, next_hop = self.dist, self.next_hop
+        if dist[index] == UNREACHABLE:
+            return []
+        affected = [index]
+        in_affected = {index}
+        for current in affected:
+            for neighbour in self._neighbours(current):
+                if next_hop[neighbour] == current and neighbour not in in_affected:
+                    in_affected.add(neighbour)
+                    affected.append(neighbour)
+        for current in affected:
+            dist[current] = UNREACHABLE
+            next_hop[current] = UNREACHABLE
+
+        # Seed from the border, then settle the region shortest-first
+        heap = []
+        for current in affected[1:]:
+            best = UNREACHABLE
+            for neighbour in self._neighbours(current):
+                d = dist[neighbour]
+                if d != UNREACHABLE and (best == UNREACHABLE or d + 1 < best):
+                    best = d + 1
+            if best != UNREACHABLE:
+                dist[current] = best
+                heapq.heappush(heap, (best, current))
+        while heap:
+            d, current = heapq.heappop(heap)
+            if d != dist[current]:
+                continue
+            for neighbour in self._neighbours(current):
+                if neighbour in in_affected and neighbour != index:
+                    nd = dist[neighbour]
+                    if nd == UNREACHABLE or nd > d + 1:
+                        dist[neighbour] = d + 1
+                        heapq.heappush(heap, (d + 1, neighbour))
+        return affected
+
+    def _refresh_hops(self, changed):
+        """Re-picks next_hop around cells whose distance changed."""
+        origin = self.destination[1] * self.cols + self.destination[0]
+        touched = set(changed)
+        for index in changed:
+            touched.update(self._neighbours(index))
+        for index in touched:
+            if index == origin or self.dist[index] == UNREACHABLE:
+                self.next_hop[index] = UNREACHABLE
+            else:
+                self.next_hop[index] = self._best_hop(index)
+
+class FieldCache:
+    """Distance fields for one grid, built on demand and shared per destination.
+
+    Call `cell_changed` after toggling a tile to repair every field built so
+    far instead of rebuilding them. Given a `grid_hash` that the owner keeps
+    current, fields and paths are also looked up in the shared memos first.
+    """
+
+    def __init__(self, grid, grid_hash=None):
+        self.grid = grid
+        self.grid_hash = grid_hash
+        self.fields = {}
+
+    def field(self, destination):
+        field = self.fields.get(destination)
+        if field is None:
+            if self.grid_hash is None:
+                field = DistanceField(self.grid, destination)
+            else:
+                key = (self.grid_hash.key(), destination)
+                snapshot = field_memo.get(key)
+                field = DistanceField(self.grid, destination, snapshot)
+                if snapshot is None:
+                    field_memo.put(key, field.snapshot(), cost=len(field.dist))
+            self.fields[destination] = field
+        return field
+
+    def path(self, start, destination):
+        if self.grid_hash is None:
+            return self.field(destination).path_from(start)
+        key = (self.grid_hash.key(), start, destination)
+        path = path_memo.get(key)
+        if path is None:
+            path = tuple(self.field(destination).path_from(start))
+            path_memo.put(key, path)
+        return list(path)
+
+    def cell_changed(self, x, y):
+        for field in self.fields.values():
+            field.cell_changed(x, y)
+
+    def invalidate(self):
+        """Drops every field; call after the grid changes."""
+        self.fields.clear()
+
+def find_path(grid, start, destination):
+    """Shortest path from start to destination, or [] if there is none."""
+    if destination is None:
+        return []
+    return DistanceField(grid, destination).path_from(start)
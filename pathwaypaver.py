@@ -1,22 +1,43 @@
+import time
+
+_import_started = time.perf_counter()
+
+import argparse
 import pygame
 import random
-import sys
+
+from cooperative import CooperativePlanner
+from hints import HintEngine, NO_SOLUTION
+from levelpack import LevelPack
+from pathfinding import memo_stats
+from presets import levels  # Swapped for a level pack by load_level_pack()
+from profiler import profiler
+from render import Camera, GridRenderer, SpriteAtlas, text_cache
+from replay import Replay, append_replay, default_replay_path, read_replays
+from scenes import Scene, SceneManager, Push, Pop, Replace, Reset, Quit
+from simulation import Simulation, SimCar, TurnClock, SUCCESS, FAIL
+from thumbnails import ThumbnailCache
+from tiles import EMPTY, ROAD, TREE, CAR_TILES, DEST_TILES
 
 # ================================
 # Initialization & Global Constants
 # ================================
-pygame.init()
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 650    # Total screen height
 HEADER_HEIGHT = 50     # Header area height
-TILE_SIZE = 50         # Each grid cell is 50x50 pixels
+TILE_SIZE = 50         # Each grid cell is 50x50 pixels at the default zoom
 
-# Grid dimensions for predefined level mode (16 x 12):
-num_cols_level = SCREEN_WIDTH // TILE_SIZE      # 16
-num_rows_level = (SCREEN_HEIGHT - HEADER_HEIGHT) // TILE_SIZE   # 600/50 = 12
+# Screen area the level's camera shows; levels of any size scroll inside it
+VIEWPORT = pygame.Rect(0, HEADER_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT - HEADER_HEIGHT)
+PAN_KEYS = {pygame.K_LEFT: (-1, 0), pygame.K_RIGHT: (1, 0), pygame.K_UP: (0, -1), pygame.K_DOWN: (0, 1)}
+SPEED_KEYS = {pygame.K_1: 1, pygame.K_2: 4, pygame.K_3: 16}  # Turn speed multipliers
 
 # Maximum allowed road tiles:
 max_tile = 30
+TURN_DELAY = 500  # Milliseconds between car moves
+HINT_SLICE = 0.006  # Seconds of each frame lent to a running hint search
+REPLAY_FILE = default_replay_path()  # Every finished level is appended here (see replay.py)
+REPLAY_MAX_BYTES = 32 * 1024 * 1024  # Oldest sessions are dropped past this, over 100,000 sessions in
 
 # ================================
 # Colors
@@ -31,14 +52,29 @@ ACCENT = (0, 150, 255)
 HOVER  = (50, 200, 255)
 HEADER_BG = (200, 200, 200)  # Light gray header background
 
-CAR_COLORS = [RED, (255, 255, 0), (255, 165, 0), (0, 128, 128)]
+CAR_COLORS = [RED, (255, 255, 0), (255, 165, 0), (0, 128, 128)]  # One per tiles.COLOR_COUNT
 DEST_COLORS = CAR_COLORS  # Use the same for destinations
 
 # ================================
 # Setup Screen
 # ================================
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Pathway Paver")
+# Importing the module opens no window and starts no SDL subsystem, so tools
+# can use the levels and classes on machines without a display
+screen = None
+startup_times = {}  # Phase -> seconds, shown in the profiler overlay
+
+def init_display():
+    """Opens the game window the first time it is needed and returns its surface."""
+    global screen
+    if screen is None:
+        started = time.perf_counter()
+        # Only what the game uses: no mixer (it has no sound) and no joystick
+        pygame.display.init()
+        pygame.font.init()
+        screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        pygame.display.set_caption("Pathway Paver")
+        startup_times["display"] = time.perf_counter() - started
+    return screen
 
 # ================================
 # Global Variables
@@ -50,186 +86,95 @@ header_buttons = []    # List of header buttons
 current_tile_count = 0 # For tile placement
 move_mode = False      # When True, the cars are moving
 game_outcome = None    # "Success!" or "Fail!" once movement finishes
+turns_left = 0         # Turns remaining in the current level
 help_shown = False  # Track if the help screen has been shown
-occupied_tiles = set()  # Tracks tiles occupied by cars
-
-# ================================
-# Level Presets
-# ================================
-levels = [
-    {
-        "name": "Level 1",
-        "layout": [
-            [0, 0, 84, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 94, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 86, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 96, 3],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-        ],
-        "max_tiles": 30,
-        "max_turns": 20
-    },
-    {
-        "name": "Level 2",
-        "layout": [
-            [0, 0, 84, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 94, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 86, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 96, 3],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0],
-            [4, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4],
-        ],
-        "max_tiles": 20,
-        "max_turns": 16
-    }, 
-       {
-        "name": "Level 3",
-        "layout": [
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4, 0],
-            [0, 0, 0, 86, 0, 0, 0, 0, 0, 0, 0, 94, 0, 0, 0, 0],
-            [0, 4, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 4, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 84, 0, 0, 0, 0, 0, 0, 0, 96, 0, 0, 4, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-        ],
-        "max_tiles": 21,
-        "max_turns": 16
-    },
-    {
-        "name": "Level 4",
-        "layout": [
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 86, 0, 0, 0, 4, 0, 0, 0, 94, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 84, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 96, 0, 0, 0, 0],
-            [0, 0, 0, 0, 0, 0, 0, 4, 0, 0, 0, 0, 0, 0, 0, 0]
-        ],
-        "max_tiles": 24,
-        "max_turns": 18
-    }
-]
+cooperative_planning = False  # Plan cars around each other (C toggles) instead of independently
+recording = None       # Replay of the current attempt, or None while a replay is being watched
+turn_speed = 1         # Turn clock multiplier (1/2/3 keys), kept from level to level
+forecast = None        # (outcome, turns) worked out ahead by an instant resolve
+hints = None           # HintEngine for the level being played
+hint = None            # ("place" or "remove", (x, y)) the player asked for, or None
+simulation = None      # Headless Simulation for the level being played
+route_previews = []    # (car, path) pairs showing where each car would drive
+grid_renderer = None   # Cached grid background and dirty cells for the level
+camera = None          # Scroll and zoom of the level view
+houses_at = {}         # (x, y) -> Set_Destination, so drawing only looks at cells in view
+cars_at = {}           # (x, y) -> cars still driving on that cell
+preview_at = {}        # (x, y) -> colors of the route previews through that cell
+connection_at = {}     # (x, y) -> whether the car or house there is connected by road
+sprite_atlas = SpriteAtlas((TILE_SIZE, TILE_SIZE))  # Car and house sprites, drawn once each
+thumbnails = None      # ThumbnailCache for the level selection screen, started on first use
 
 # Track the current level
 currentLevel = 0
 completed_levels = [False] * len(levels)  # Initialize all levels as incomplete
 completed_levels[0] = True  # Level 1 is always active
 
+def level_thumbnails():
+    global thumbnails
+    if thumbnails is None:
+        # Thumbnails use the level's own colors: grass, roads and trees, then the cars and houses
+        palette = {EMPTY: WHITE, ROAD: GRAY, TREE: (0, 100, 0)}
+        for tile in CAR_TILES:
+            palette[tile] = CAR_COLORS[(tile - CAR_TILES[0]) % len(CAR_COLORS)]
+        for tile in DEST_TILES:
+            palette[tile] = DEST_COLORS[(tile - DEST_TILES[0]) % len(DEST_COLORS)]
+        thumbnails = ThumbnailCache(levels, palette=palette)
+    return thumbnails
+
+def load_level_pack(path):
+    """Plays the levels of a pack file (see levelpack.py) instead of the built-in presets."""
+    global levels, completed_levels, currentLevel, thumbnails
+
+    # Only the pack's header is read here; each level is decoded when it is played
+    pack = LevelPack(path)
+    if not len(pack):
+        pack.close()
+        raise ValueError(f"{path} holds no levels")
+    levels = pack
+    if thumbnails is not None:
+        thumbnails.close()  # Made for the levels that were just replaced
+        thumbnails = None
+    completed_levels = [False] * len(levels)
+    completed_levels[0] = True
+    currentLevel = 0
+
 # ================================
 # Classes
 # ================================
-class Car:
+class Car(SimCar):
     def __init__(self, start_x, start_y):
-        self.x = start_x
-        self.y = start_y
-        self.path = []     # List of (x, y) positions
+        super().__init__(start_x, start_y)
         self.color = BLACK # Will be set appropriately
-        self.id = None     # Car order id (0-based; display as id + 1)
-        self.destination = None  # Tuple (x, y)
-        self.reached = False
+
+    def direction(self):
+        """(dx, dy) toward the next position in the path, or None when parked."""
+        next_position = self.next_step()
+        if next_position is None:
+            return None
+        next_x, next_y = next_position  # Get the next position in the path
+        return (next_x - self.x, next_y - self.y)
+
+    def sprite(self):
+        direction = self.direction()
+        return sprite_atlas.get(("car", self.color, self.id, direction),
+                                lambda surface: draw_car_sprite(surface, self.color, self.id, direction),
+                                (camera.tile_size, camera.tile_size))
+
+    def blit_item(self):
+        """(sprite, position) for Surface.blits."""
+        return self.sprite(), camera.cell_rect(self.x, self.y).topleft
 
     def draw(self):
         # Skip drawing if the car has reached its destination
         if self.reached:
             return
-
-        # Calculate the car's position and size
-        car_x = self.x * TILE_SIZE + TILE_SIZE // 6
-        car_y = HEADER_HEIGHT + self.y * TILE_SIZE + TILE_SIZE // 6
-        car_width = TILE_SIZE * 2 // 3
-        car_height = TILE_SIZE * 2 // 3
-
-        # Draw the car body (rounded rectangle)
-        car_rect = pygame.Rect(car_x, car_y, car_width, car_height)
-        pygame.draw.rect(screen, self.color, car_rect, border_radius=8)
-
-        # Draw the wheels (small black circles)
-        wheel_radius = TILE_SIZE // 10
-        wheel_offset_x = TILE_SIZE // 1.5
-        wheel_offset_y = TILE_SIZE // 1.5
-
-        # Front-left wheel
-        pygame.draw.circle(screen, BLACK, (car_x + wheel_offset_x, car_y + car_height - wheel_offset_y), wheel_radius)
-        # Front-right wheel
-        pygame.draw.circle(screen, BLACK, (car_x + car_width - wheel_offset_x, car_y + car_height - wheel_offset_y), wheel_radius)
-        # Rear-left wheel
-        pygame.draw.circle(screen, BLACK, (car_x + wheel_offset_x, car_y + wheel_offset_y), wheel_radius)
-        # Rear-right wheel
-        pygame.draw.circle(screen, BLACK, (car_x + car_width - wheel_offset_x, car_y + wheel_offset_y), wheel_radius)
-
-        # Draw the car ID inside the car body
-        font = pygame.font.Font(None, 20)
-        text = font.render(f"{self.id + 1}", True, WHITE)
-        text_rect = text.get_rect(center=car_rect.center)
-        screen.blit(text, text_rect)
-
-        # Draw the windshield to indicate direction
-        if self.path:
-            next_x, next_y = self.path[0]  # Get the next position in the path
-            dx = next_x - self.x
-            dy = next_y - self.y
-
-            # Determine the windshield position based on direction
-            if dx == 1:  # Moving right
-                windshield_rect = pygame.Rect(car_x + car_width - 5, car_y + car_height // 4, 5, car_height // 2)
-            elif dx == -1:  # Moving left
-                windshield_rect = pygame.Rect(car_x, car_y + car_height // 4, 5, car_height // 2)
-            elif dy == 1:  # Moving down
-                windshield_rect = pygame.Rect(car_x + car_width // 4, car_y + car_height - 5, car_width // 2, 5)
-            elif dy == -1:  # Moving up
-                windshield_rect = pygame.Rect(car_x + car_width // 4, car_y, car_width // 2, 5)
-            else:
-                windshield_rect = None
-
-            # Draw the windshield
-            if windshield_rect:
-                pygame.draw.rect(screen, BLUE, windshield_rect)
+        screen.blit(*self.blit_item())
 
     def find_path(self, start, destination):
-        """Uses BFS to find a path from start to destination."""
-        queue = [(start[0], start[1], [])]
-        visited = set()
-        current_rows = len(grid_data)
-        current_cols = len(grid_data[0]) if current_rows > 0 else 0
-        while queue:
-            x, y, path = queue.pop(0)
-            if (x, y) == destination:
-                self.path = path + [(x, y)]
-                return self.path
-            if (x, y) in visited:
-                continue
-            visited.add((x, y))
-            for dx, dy in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
-                nx, ny = x + dx, y + dy
-                if 0 <= nx < current_cols and 0 <= ny < current_rows:
-                    if grid_data[ny][nx] in [1, 3]:
-                        queue.append((nx, ny, path + [(nx, ny)]))
-        return []
+        """Shortest path from start to destination, memoized on the grid's hash."""
+        self.path = simulation.fields.path(start, destination)
+        return self.path
 
 class Set_Destination:
     def __init__(self, x, y, dest_id, color):
@@ -237,26 +182,81 @@ class Set_Destination:
         self.y = y
         self.id = dest_id
         self.color = color
-        grid_data[y][x] = 3  # Mark destination with 3
+
+    def sprite(self):
+        return sprite_atlas.get(("house", self.color), lambda surface: draw_house_sprite(surface, self.color),
+                                (camera.tile_size, camera.tile_size))
+
+    def blit_item(self):
+        """(sprite, position) for Surface.blits."""
+        return self.sprite(), camera.cell_rect(self.x, self.y).topleft
 
     def draw(self):
-        # Calculate the position and size of the house
-        house_x = self.x * TILE_SIZE
-        house_y = HEADER_HEIGHT + self.y * TILE_SIZE
-        house_width = TILE_SIZE
-        house_height = TILE_SIZE
-
-        # Draw the base of the house (rectangle)
-        base_rect = pygame.Rect(house_x + house_width // 6, house_y + house_height // 3, house_width * 2 // 3, house_height * 2 // 3)
-        pygame.draw.rect(screen, self.color, base_rect)
-
-        # Draw the roof of the house (triangle)
-        roof_points = [
-            (house_x + house_width // 2, house_y),  # Top point of the triangle
-            (house_x + house_width // 6, house_y + house_height // 3),  # Bottom-left point
-            (house_x + house_width * 5 // 6, house_y + house_height // 3)  # Bottom-right point
-        ]
-        pygame.draw.polygon(screen, self.color, roof_points)
+        screen.blit(*self.blit_item())
+
+def draw_car_sprite(surface, color, car_id, direction):
+    """Draws a car filling one tile-sized sprite; called once per atlas entry."""
+    # Calculate the car's position and size
+    car_x = TILE_SIZE // 6
+    car_y = TILE_SIZE // 6
+    car_width = TILE_SIZE * 2 // 3
+    car_height = TILE_SIZE * 2 // 3
+
+    # Draw the car body (rounded rectangle)
+    car_rect = pygame.Rect(car_x, car_y, car_width, car_height)
+    pygame.draw.rect(surface, color, car_rect, border_radius=8)
+
+    # Draw the wheels (small black circles)
+    wheel_radius = TILE_SIZE // 10
+    wheel_offset_x = TILE_SIZE // 1.5
+    wheel_offset_y = TILE_SIZE // 1.5
+
+    # Front-left wheel
+    pygame.draw.circle(surface, BLACK, (car_x + wheel_offset_x, car_y + car_height - wheel_offset_y), wheel_radius)
+    # Front-right wheel
+    pygame.draw.circle(surface, BLACK, (car_x + car_width - wheel_offset_x, car_y + car_height - wheel_offset_y), wheel_radius)
+    # Rear-left wheel
+    pygame.draw.circle(surface, BLACK, (car_x + wheel_offset_x, car_y + wheel_offset_y), wheel_radius)
+    # Rear-right wheel
+    pygame.draw.circle(surface, BLACK, (car_x + car_width - wheel_offset_x, car_y + wheel_offset_y), wheel_radius)
+
+    # Draw the car ID inside the car body
+    text = text_cache.render(f"{car_id + 1}", 20, WHITE)
+    text_rect = text.get_rect(center=car_rect.center)
+    surface.blit(text, text_rect)
+
+    # Determine the windshield position based on direction
+    if direction == (1, 0):  # Moving right
+        windshield_rect = pygame.Rect(car_x + car_width - 5, car_y + car_height // 4, 5, car_height // 2)
+    elif direction == (-1, 0):  # Moving left
+        windshield_rect = pygame.Rect(car_x, car_y + car_height // 4, 5, car_height // 2)
+    elif direction == (0, 1):  # Moving down
+        windshield_rect = pygame.Rect(car_x + car_width // 4, car_y + car_height - 5, car_width // 2, 5)
+    elif direction == (0, -1):  # Moving up
+        windshield_rect = pygame.Rect(car_x + car_width // 4, car_y, car_width // 2, 5)
+    else:
+        windshield_rect = None
+
+    # Draw the windshield to indicate direction
+    if windshield_rect:
+        pygame.draw.rect(surface, BLUE, windshield_rect)
+
+def draw_house_sprite(surface, color):
+    """Draws a house filling one tile-sized sprite; called once per atlas entry."""
+    house_width = TILE_SIZE
+    house_height = TILE_SIZE
+
+    # Draw the base of the house (rectangle)
+    base_rect = pygame.Rect(house_width // 6, house_height // 3, house_width * 2 // 3, house_height * 2 // 3)
+    pygame.draw.rect(surface, color, base_rect)
+
+    # Draw the roof of the house (triangle)
+    roof_points = [
+        (house_width // 2, 0),  # Top point of the triangle
+        (house_width // 6, house_height // 3),  # Bottom-left point
+        (house_width * 5 // 6, house_height // 3)  # Bottom-right point
+    ]
+    pygame.draw.polygon(surface, color, roof_points)
 
 class Button:
     def __init__(self, text, x, y, width, height, callback):
@@ -269,8 +269,7 @@ class Button:
 
     def draw(self, surface):
         pygame.draw.rect(surface, self.color, self.rect, border_radius=8)
-        font = pygame.font.Font(None, 24)
-        text_surface = font.render(self.text, True, WHITE)
+        text_surface = text_cache.render(self.text, 24, WHITE)
         text_rect = text_surface.get_rect(center=self.rect.center)
         surface.blit(text_surface, text_rect)
 
@@ -278,16 +277,17 @@ class Button:
         return self.rect.collidepoint(pos)
 
     def handle_event(self, event):
+        """Returns the callback's scene transition when clicked."""
         if event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 1 and self.is_hovered(event.pos):
-                self.callback()
+                return self.callback()
+        return None
 
 # ================================
 # Utility Functions
 # ================================
 def display_tile_count(tileCount, maxTile):
-    font = pygame.font.Font(None, 36)
-    text = font.render(f"Tiles: {tileCount}/{maxTile}", True, BLACK)
+    text = text_cache.render(f"Tiles: {tileCount}/{maxTile}", 36, BLACK)
     screen.blit(text, (10, 10))
 
 def draw_header(game_outcome):
@@ -296,21 +296,31 @@ def draw_header(game_outcome):
 
     # Display the level name on the left
     level_name = levels[currentLevel]["name"]
-    font = pygame.font.Font(None, 36)
-    level_text = font.render(f"Level: {level_name}", True, BLACK)
+    level_text = text_cache.render(f"Level: {level_name}", 36, BLACK)
     screen.blit(level_text, (10, 10))
 
     # Display the tile limit on the right
-    tile_text = font.render(f"Tiles: {current_tile_count}/{levels[currentLevel]['max_tiles']}", True, BLACK)
+    tile_text = text_cache.render(f"Tiles: {current_tile_count}/{levels[currentLevel]['max_tiles']}", 36, BLACK)
     screen.blit(tile_text, (SCREEN_WIDTH - 500, 10))  # Adjusted position to the right
 
     # Display the turns left below the tile limit
-    turn_text = font.render(f"Turns Left: {turns_left}", True, BLACK)
+    turn_text = text_cache.render(f"Turns Left: {turns_left}", 36, BLACK)
     screen.blit(turn_text, (SCREEN_WIDTH - 500, 30))  # Adjusted position to the right
 
+    # Speed and forecast go under the level name
+    status = []
+    if turn_speed != 1:
+        status.append(f"Speed {turn_speed}x")
+    if forecast is not None:
+        status.append(f"Forecast: {forecast[0]} after {forecast[1]} turns")
+    if hint_text() is not None:
+        status.append(hint_text())
+    if status:
+        screen.blit(text_cache.render("   ".join(status), 18, BLACK), (10, 36))
+
     # Display the game outcome in the center
     if game_outcome is not None:
-        outcome_text = font.render(game_outcome, True, BLACK)
+        outcome_text = text_cache.render(game_outcome, 36, BLACK)
         text_rect = outcome_text.get_rect(center=(SCREEN_WIDTH // 2, HEADER_HEIGHT // 2))
         screen.blit(outcome_text, text_rect)
 
@@ -318,342 +328,715 @@ def draw_header(game_outcome):
     for btn in header_buttons:
         btn.draw(screen)
 
+PROFILER_OVERLAY_RECT = pygame.Rect(10, SCREEN_HEIGHT - 170, 340, 160)
+
+def handle_profiler_key(event):
+    """F3 toggles the profiler overlay, F4 saves recorded frames as a Chrome trace."""
+    if event.type != pygame.KEYDOWN:
+        return False
+    if event.key == pygame.K_F3:
+        profiler.overlay_visible = not profiler.overlay_visible
+        return True
+    if event.key == pygame.K_F4:
+        path = profiler.export_chrome_trace(time.strftime("pathwaypaver-trace-%Y%m%d-%H%M%S.json"))
+        print(f"Profiler trace written to {path}")
+        return True
+    return False
+
+def draw_profiler_overlay():
+    if not profiler.overlay_visible:
+        return
+    panel = pygame.Surface(PROFILER_OVERLAY_RECT.size, pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 170))
+    screen.blit(panel, PROFILER_OVERLAY_RECT)
+    # Overlay text changes every frame, so it bypasses the text cache
+    font = text_cache.font(20)
+    lines = profiler.overlay_lines()[:6]
+    memos = memo_stats()
+    lines.append(f"memo hits: paths {memos['paths']['hit_rate']:.0%}, fields {memos['fields']['hit_rate']:.0%}")
+    lines.append("startup " + ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in startup_times.items()))
+    for i, line in enumerate(lines):
+        screen.blit(font.render(line, True, WHITE), (PROFILER_OVERLAY_RECT.x + 8, PROFILER_OVERLAY_RECT.y + 6 + i * 19))
+
 def handle_tile_click(mouse_x, mouse_y, tileCount):
-    max_tiles = levels[currentLevel]["max_tiles"]
-    if mouse_y < HEADER_HEIGHT:
+    cell = camera.cell_at(mouse_x, mouse_y)  # None over the header or off the map
+    if cell is None:
         return tileCount
-    grid_x = mouse_x // TILE_SIZE
-    grid_y = (mouse_y - HEADER_HEIGHT) // TILE_SIZE
-    if 0 <= grid_x < num_cols_level and 0 <= grid_y < num_rows_level:
-        if grid_data[grid_y][grid_x] not in [2, 3, 4]:  # Prevent placing tiles on trees (4)
-            if grid_data[grid_y][grid_x] == 0 and tileCount < max_tiles:
-                grid_data[grid_y][grid_x] = 1
-                return tileCount + 1
-            elif grid_data[grid_y][grid_x] == 1:
-                grid_data[grid_y][grid_x] = 0
-                return tileCount - 1
-    return tileCount
+    return tileCount + toggle_cell(*cell)
+
+def toggle_cell(grid_x, grid_y):
+    """Places or removes a road tile and records it. Returns the change in tile count."""
+    # The simulation refuses trees (4), houses (3) and tiles over the level's limit
+    change = simulation.toggle_tile(grid_x, grid_y)
+    if change:
+        grid_renderer.tile_changed(grid_x, grid_y)
+        refresh_route_previews()
+        refresh_connections()
+        hints.toggled((grid_x, grid_y), change > 0)
+        set_hint(None)
+        if recording is not None:
+            recording.toggles.append((grid_x, grid_y))
+    return change
+
+def handle_camera_event(event):
+    """Arrow keys and right-drag scroll, the mouse wheel zooms. Returns True if the view moved."""
+    if event.type == pygame.MOUSEWHEEL:
+        return camera.zoom(event.y, pygame.mouse.get_pos())
+    if event.type == pygame.MOUSEMOTION and event.buttons[2]:
+        return camera.pan(-event.rel[0], -event.rel[1])
+    if event.type == pygame.KEYDOWN and event.key in PAN_KEYS:
+        dx, dy = PAN_KEYS[event.key]
+        step = 4 * camera.tile_size
+        return camera.pan(dx * step, dy * step)
+    return False
+
+def refresh_route_previews():
+    global route_previews
+    # The simulation repairs its distance fields on every toggle, so this is cheap
+    clear_route_previews()
+    route_previews = [(car, simulation.route(car)) for car in cars]
+    for car, path in route_previews:
+        for cell in path[:-1]:  # The house itself marks the end of the route
+            preview_at.setdefault(cell, []).append(car.color)
+        grid_renderer.mark_cells(path)
+
+def clear_route_previews():
+    global route_previews
+    for car, path in route_previews:
+        grid_renderer.mark_cells(path)
+    route_previews = []
+    preview_at.clear()
+
+def draw_route_previews(cells):
+    radius = camera.tile_size // 10
+    for cell in cells:
+        colors = preview_at.get(cell)
+        if colors:
+            center = camera.cell_rect(*cell).center
+            for color in colors:
+                pygame.draw.circle(screen, color, center, radius)
+
+def refresh_connections():
+    """Updates the connected/disconnected badge of every parked car and house.
+
+    The simulation keeps the road network's components current on every toggle,
+    so each car is a few label lookups; only badges that changed are redrawn.
+    """
+    status = {}
+    for car in cars:
+        if car.reached or car.destination is None:
+            continue
+        connected = simulation.connected(car)
+        status[(car.x, car.y)] = connected
+        # A house is connected once every car heading to it is
+        status[car.destination] = status.get(car.destination, True) and connected
+    for cell in connection_at.keys() | status.keys():
+        if connection_at.get(cell) != status.get(cell):
+            grid_renderer.mark_cell(*cell)
+    connection_at.clear()
+    connection_at.update(status)
+
+def clear_connections():
+    grid_renderer.mark_cells(connection_at)
+    connection_at.clear()
+
+def draw_connection_badges(cells):
+    radius = max(camera.tile_size // 8, 2)
+    for cell in cells:
+        connected = connection_at.get(cell)
+        if connected is not None:
+            rect = camera.cell_rect(*cell)
+            center = (rect.right - radius - 1, rect.top + radius + 1)
+            pygame.draw.circle(screen, (0, 170, 0) if connected else RED, center, radius)
+            pygame.draw.circle(screen, WHITE, center, radius, 1)
+
+def request_hint():
+    """H or the Hint button: shows the next tile at once if it is known, otherwise starts looking."""
+    if move_mode:
+        return
+    hints.request()
+    set_hint(hints.hint())
+
+def set_hint(new_hint):
+    global hint
+    if hint is not None:
+        grid_renderer.mark_cell(*hint[1])
+    hint = new_hint
+    if hint is not None:
+        grid_renderer.mark_cell(*hint[1])
+
+def hint_text():
+    if hint is not None:
+        return "Hint: pave the outlined tile" if hint[0] == "place" else "Hint: clear the outlined tile"
+    if hints is None:
+        return None
+    if hints.searching:
+        return "Hint: thinking..."
+    if hints.status == NO_SOLUTION:
+        return "Hint: no solution from here"
+    return None
+
+def draw_hint(cells):
+    if hint is not None and hint[1] in cells:
+        pygame.draw.rect(screen, ACCENT, camera.cell_rect(*hint[1]), 3)
 
 # ================================
 # Predefined Level Mode Functions
 # ================================
 def load_level_objectives():
-    global cars, destinations_list, grid_data, occupied_tiles
-    cars = []
+    global cars, destinations_list, grid_data, simulation, grid_renderer, route_previews
+    global camera, houses_at, hints, hint
+
+    # The simulation owns the grid, cars and occupancy (`simulation.occupied`); the globals are views onto it
+    simulation = Simulation.from_level(levels[currentLevel], car_factory=Car, log=print,
+                                       planner=current_planner())
+    grid_data = simulation.grid
+    cars = simulation.cars
+    for car in cars:
+        car.color = CAR_COLORS[car.id % len(CAR_COLORS)]
     destinations_list = []
-    occupied_tiles = set()  # Reset occupied tiles
-
-    level_data = levels[currentLevel]
-    grid_data = [[level_data["layout"][y][x] for x in range(num_cols_level)] for y in range(num_rows_level)]
-    for y, row in enumerate(level_data["layout"]):
-        for x, tile in enumerate(row):
-            if 80 <= tile <= 89:
-                car_id = tile - 80
-                car_color = CAR_COLORS[car_id % len(CAR_COLORS)]
-                car = Car(x, y)
-                car.id = car_id
-                car.color = car_color
-                cars.append(car)
-                occupied_tiles.add((x, y))  # Mark the car's starting position as occupied
-            elif 90 <= tile <= 99:
-                dest_id = tile - 90
-                dest_color = DEST_COLORS[dest_id % len(DEST_COLORS)]
-                dest = Set_Destination(x, y, dest_id=dest_id, color=dest_color)
-                destinations_list.append(dest)
+    for x, y, dest_id in simulation.destinations:
+        dest_color = DEST_COLORS[dest_id % len(DEST_COLORS)]
+        destinations_list.append(Set_Destination(x, y, dest_id=dest_id, color=dest_color))
+    houses_at = {(dest.x, dest.y): dest for dest in destinations_list}
+    index_cars()
+    camera = Camera(simulation.cols, simulation.rows, VIEWPORT, TILE_SIZE)
+    grid_renderer = GridRenderer(camera, draw_grid_cell)
+    route_previews = []
+    preview_at.clear()
+    refresh_route_previews()
+    connection_at.clear()
+    refresh_connections()
+    if hints is not None:
+        hints.cancel()  # Still searching the level that was left
+    hints = HintEngine(levels[currentLevel])
+    hint = None
+
+def index_cars():
+    global cars_at
+    cars_at = {}
     for car in cars:
-        for dest in destinations_list:
-            if car.color == dest.color:
-                car.destination = (dest.x, dest.y)
-                break
+        if not car.reached:
+            cars_at.setdefault((car.x, car.y), []).append(car)
+
+def move_in_index(car, old_cell):
+    """Moves `car` from `old_cell` in cars_at, dropping it once it has reached its house."""
+    parked = cars_at.get(old_cell)
+    if parked is not None and car in parked:
+        parked.remove(car)
+        if not parked:
+            del cars_at[old_cell]
+    if not car.reached:
+        cars_at.setdefault((car.x, car.y), []).append(car)
+
+def current_planner():
+    return CooperativePlanner() if cooperative_planning else None
+
+def toggle_cooperative_planning():
+    global cooperative_planning
+    cooperative_planning = not cooperative_planning
+    simulation.planner = current_planner()
+    print("Cooperative planning", "on" if cooperative_planning else "off")
+
+def draw_grid_cell(surface, x, y, rect):
+    # Draw the grid background as green
+    pygame.draw.rect(surface, WHITE, rect)  # Light green background
+
+    # Draw grid lines
+    pygame.draw.rect(surface, GRAY, rect, 1)
+
+    if grid_data[y][x] == 1:  # Road tiles
+        pygame.draw.rect(surface, GRAY, rect)
+    elif grid_data[y][x] == 4:  # Trees
+        pygame.draw.rect(surface, (0, 100, 0), rect)  # Dark green for trees
 
 def draw_grid_level():
-    for y in range(num_rows_level):
-        for x in range(num_cols_level):
-            rect = pygame.Rect(x * TILE_SIZE, HEADER_HEIGHT + y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-            
-            # Draw the grid background as green
-            pygame.draw.rect(screen, WHITE, rect)  # Light green background
-            
-            # Draw grid lines
-            pygame.draw.rect(screen, GRAY, rect, 1)
-            
-            if grid_data[y][x] == 1:  # Road tiles
-                pygame.draw.rect(screen, GRAY, rect)
-            elif grid_data[y][x] == 4:  # Trees
-                pygame.draw.rect(screen, (0, 100, 0), rect)  # Dark green for trees
-
-def load_level_game_loop():
-    global current_tile_count, move_mode, game_outcome, header_buttons, turns_left, help_shown
+    # Chunks are pre-rendered by grid_renderer; only the ones in view are blitted
+    grid_renderer.blit_background(screen)
+
+def draw_level_objects(cells=None):
+    """Draws route previews, houses and cars on `cells`, or on every cell in view."""
+    if cells is None:
+        cells = camera.visible_cells()
+    if not move_mode:
+        draw_route_previews(cells)
+    # Houses first, then cars, all in a single batched blit
+    items = [houses_at[cell].blit_item() for cell in cells if cell in houses_at]
+    items += [car.blit_item() for cell in cells for car in cars_at.get(cell, ())]
+    screen.blits(items, doreturn=False)
+    if not move_mode:
+        draw_connection_badges(cells)
+        draw_hint(cells)
+
+def draw_level_frame(header_state):
+    """Draws and presents one frame of the level; returns the header state it showed."""
+    if grid_renderer.full_redraw:
+        with profiler.phase("header"):
+            screen.fill(WHITE)
+            draw_header(game_outcome)
+        screen.set_clip(VIEWPORT)  # Cells at the edge of the view must not spill onto the header
+        with profiler.phase("grid"):
+            draw_grid_level()
+        with profiler.phase("objects"):
+            draw_level_objects()
+        screen.set_clip(None)
+    else:
+        # Only the header text and cells touched since last frame are redrawn
+        if header_state != header_key():
+            with profiler.phase("header"):
+                draw_header(game_outcome)
+            grid_renderer.mark_rect((0, 0, SCREEN_WIDTH, HEADER_HEIGHT))
+        if profiler.overlay_visible:
+            grid_renderer.mark_area(PROFILER_OVERLAY_RECT)
+        screen.set_clip(VIEWPORT)
+        with profiler.phase("grid"):
+            cells = grid_renderer.restore_dirty(screen)
+        with profiler.phase("objects"):
+            draw_level_objects(cells)
+        screen.set_clip(None)
+    draw_profiler_overlay()
+    with profiler.phase("present"):
+        grid_renderer.present()
+    return header_key()
+
+def header_key():
+    """Everything the header shows, so it is only redrawn when one of them changes."""
+    return (current_tile_count, turns_left, game_outcome, turn_speed, forecast, hint_text())
+
+def reset_level_state(record=True):
+    """Loads levels[currentLevel] with no tiles placed and the cars parked."""
+    global current_tile_count, move_mode, game_outcome, turns_left, recording, forecast
 
     load_level_objectives()
+    forecast = None
+    recording = Replay.for_level(currentLevel, levels[currentLevel]) if record else None
     current_tile_count = 0
     move_mode = False
     game_outcome = None
-    turns_left = levels[currentLevel]["max_turns"]  # Initialize turns_left to max_turns
-
-    button_width = 100
-    button_height = 30
-    gap = 10
-    total_buttons_width = 3 * button_width + 2 * gap
-    start_x = SCREEN_WIDTH - total_buttons_width - 10
-    restart_btn = Button("Restart", start_x, 10, button_width, button_height, restart_game_callback_level)
-    level_btn = Button("Level Selection", start_x + button_width + gap, 10, button_width, button_height, level_selection_screen)
-    help_btn = Button("Help", start_x + 2 * (button_width + gap), 10, button_width, button_height, help_screen)
-    header_buttons = [restart_btn, level_btn, help_btn]
-
-    # Automatically show the help screen the first time Level 1 is played
-    if currentLevel == 0 and not help_shown:
-        help_screen()
-        help_shown = True
-
-    clock = pygame.time.Clock()
-    last_move_time = pygame.time.get_ticks()
-
-    running = True
-    while running:
-        screen.fill(WHITE)
-        draw_header(game_outcome)
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if event.pos[1] < HEADER_HEIGHT:
-                    for btn in header_buttons:
-                        btn.handle_event(event)
-                elif not move_mode:
-                    current_tile_count = handle_tile_click(event.pos[0], event.pos[1], current_tile_count)
-            if not move_mode and event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_SPACE:
-                    for car in cars:
-                        path = car.find_path((car.x, car.y), car.destination)
-                        print(f"Car {car.id} path:", path)
-                    move_mode = True
-
-        if move_mode:
-            current_time = pygame.time.get_ticks()
-            if current_time - last_move_time >= 500:
-                process_turn()
-                last_move_time = current_time
+    turns_left = simulation.turns_left  # Starts at the level's max_turns
 
-        draw_grid_level()
-        for dest in destinations_list:
-            dest.draw()
-        for car in cars:
-            car.draw()
+def start_moving():
+    global move_mode
 
-        pygame.display.flip()
-        clock.tick(60)
+    simulation.start()
+    if recording is not None:
+        recording.cooperative = cooperative_planning
+    for car in cars:
+        print(f"Car {car.id} path:", car.path)
+        grid_renderer.mark_cell(car.x, car.y)  # Windshields appear
+    clear_route_previews()
+    clear_connections()
+    hints.cancel()
+    set_hint(None)
+    move_mode = True
+
+def forecast_outcome():
+    """Plays the paved level to its end on a headless copy; returns (outcome, turns used).
+
+    Turns are deterministic, so the level on screen will end the same way.
+    """
+    roads = [(x, y) for y, row in enumerate(grid_data) for x, tile in enumerate(row) if tile == ROAD]
+    ahead = Simulation.from_level(levels[currentLevel], placements=roads, planner=current_planner())
+    return ahead.run(), ahead.turns_used
+
+class LevelScene(Scene):
+    name = "level"
+
+    def __init__(self, level_index, replay=None, speed=None):
+        self.level_index = level_index
+        self.replay = replay    # Recorded session to play back instead of taking input
+        self.speed = speed      # Overrides turn_speed when given
+        self.clock = TurnClock(TURN_DELAY)
+        self.turns_played = 0
+        self.header_state = None
+        self.show_help = False
+
+    def enter(self):
+        global currentLevel, header_buttons, turn_speed
+
+        currentLevel = self.level_index
+        reset_level_state(record=self.replay is None)
+        self.turns_played = 0
+        if self.speed is not None:
+            turn_speed = self.speed
+        self.clock.speed = turn_speed
+
+        button_width = 100
+        button_height = 30
+        gap = 10
+        total_buttons_width = 3 * button_width + 2 * gap
+        start_x = SCREEN_WIDTH - total_buttons_width - 10
+        restart_btn = Button("Restart", start_x, 10, button_width, button_height, restart_game_callback_level)
+        level_btn = Button("Level Selection", start_x + button_width + gap, 10, button_width, button_height, level_selection_callback)
+        help_btn = Button("Help", start_x + 2 * (button_width + gap), 10, button_width, button_height, help_callback)
+        # The hint button sits between the level name and the tile count
+        hint_btn = Button("Hint", 200, 8, 80, 24, hint_callback)
+        header_buttons = [restart_btn, level_btn, help_btn, hint_btn]
+
+        # Automatically show the help screen the first time Level 1 is played
+        self.show_help = currentLevel == 0 and not help_shown and self.replay is None
+        if self.replay is not None:
+            self.start_replay()
+        self.header_state = None
+        grid_renderer.invalidate()
+
+    def start_replay(self):
+        """Paves the recorded tiles and sets the cars off, as the player did."""
+        global current_tile_count, cooperative_planning
+
+        if Replay.for_level(currentLevel, levels[currentLevel]).level_crc != self.replay.level_crc:
+            print(f"Replay: level {currentLevel + 1} differs from the one that was recorded")
+        for x, y in self.replay.toggles:
+            change = toggle_cell(x, y)
+            if not change:
+                print(f"Replay: the tile at {(x, y)} could not be toggled")
+            current_tile_count += change
+        cooperative_planning = self.replay.cooperative
+        simulation.planner = current_planner()
+        self.start_moving()
+
+    def start_moving(self):
+        start_moving()
+        self.clock.start(pygame.time.get_ticks())
+
+    def set_speed(self, speed):
+        global turn_speed
+        turn_speed = speed
+        self.clock.set_speed(pygame.time.get_ticks(), speed)
+
+    def resolve_instantly(self):
+        """Enter: works the outcome out at once and shows it while the cars drive; Enter again skips to it."""
+        global forecast
+        if not move_mode:
+            self.start_moving()
+        if forecast is None:
+            forecast = forecast_outcome()
+            return
+        while game_outcome is None:
+            self.play_turn()
+
+    def play_turn(self):
+        process_turn()
+        self.turns_played += 1
+        if self.replay is not None:
+            mismatch = self.replay.check_turn(self.turns_played, simulation)
+            if mismatch is not None:
+                print(f"Replay: {mismatch}")
+
+    def exit(self):
+        hints.cancel()
+
+    def resume(self):
+        grid_renderer.invalidate()  # Another screen or the profiler overlay drew over the level
+
+    def wake_in(self, now):
+        if self.show_help or game_outcome is not None:
+            return 0
+        if move_mode:
+            return self.clock.wake_in(now)
+        if hints.searching:
+            return 0  # Every frame lends the hint search a slice
+        return None  # Nothing moves until the player clicks or presses SPACE
 
-        # Show the result screen if the game ends
-        if game_outcome in ["Success!", "Fail!"]:
-            display_result_screen()
-            running = False
+    def handle_event(self, event):
+        global current_tile_count
+
+        if event.type in (pygame.MOUSEBUTTONDOWN, pygame.KEYDOWN):
+            self.dirty = True
+        if handle_camera_event(event):
+            grid_renderer.invalidate()
+            self.dirty = True
+            return None
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if event.pos[1] < HEADER_HEIGHT:
+                for btn in header_buttons:
+                    transition = btn.handle_event(event)
+                    if transition is not None:
+                        return transition
+            elif not move_mode:
+                current_tile_count = handle_tile_click(event.pos[0], event.pos[1], current_tile_count)
+        if not move_mode and event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+            self.start_moving()
+        if not move_mode and event.type == pygame.KEYDOWN and event.key == pygame.K_c:
+            toggle_cooperative_planning()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_h:
+            request_hint()
+        if event.type == pygame.KEYDOWN and event.key in SPEED_KEYS:
+            self.set_speed(SPEED_KEYS[event.key])
+        if game_outcome is None and event.type == pygame.KEYDOWN and event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+            self.resolve_instantly()
+        return None
+
+    def update(self, now):
+        global help_shown
+
+        if self.show_help:
+            self.show_help = False
+            help_shown = True
+            return Push(HelpScene())
+        # The final turn has been drawn by now, so the result goes on top of it
+        if game_outcome in [SUCCESS, FAIL]:
+            return Push(ResultScene(game_outcome))
+        if hints.searching:
+            # The search only runs inside this slice, so drawing never waits on it
+            if hints.run_slice(HINT_SLICE):
+                set_hint(hints.hint())
+                self.dirty = True
+        if move_mode:
+            # The clock is fixed-step: a late frame runs the turns it owes
+            for _ in range(self.clock.due(now)):
+                self.play_turn()
+                self.dirty = True
+                if game_outcome is not None:
+                    break
+        return None
 
-    pygame.quit()
+    def draw(self, surface):
+        self.header_state = draw_level_frame(self.header_state)
 
 def restart_game_callback_level():
-    load_level_game_loop()
+    return Reset(MainMenuScene(), LevelScene(currentLevel))
 
-def process_turn():
-    global move_mode, game_outcome, turns_left, occupied_tiles
-
-    # Decrease the number of turns left
-    turns_left -= 1
-    print(f"Turns left: {turns_left}")
-
-    # Fail the level if no turns are left
-    if turns_left < 0:
-        move_mode = False
-        game_outcome = "Fail!"
-        print("No turns left! Game Over.")
-        display_result_screen()
-        return
+def level_selection_callback():
+    return Replace(LevelSelectionScene())
 
-    all_cars_reached = True
-    new_occupied_tiles = set()  # Track tiles that will be occupied after this turn
+def help_callback():
+    return Push(HelpScene())
 
-    # Sort cars by ID to ensure lower ID cars move first
-    for car in sorted(cars, key=lambda c: c.id):
-        if not car.reached:
-            if not car.path:
-                # Fail the round if a car has no valid path
-                move_mode = False
-                game_outcome = "Fail!"
-                print(f"Car {car.id} has no valid path! Game Over.")
-                display_result_screen()
-                return
-
-            # Get the next position in the car's path
-            next_position = car.path[0]
-
-            # Check if the next position is already occupied
-            if next_position in occupied_tiles or next_position in new_occupied_tiles:
-                print(f"Car {car.id} cannot move to {next_position} because it is occupied!")
-                all_cars_reached = False
-                continue
-
-            # Move the car to the next position
-            car.path.pop(0)
-            car.x, car.y = next_position
-            new_occupied_tiles.add(next_position)
-
-            # Check if the car has reached its destination
-            if (car.x, car.y) == car.destination:
-                car.reached = True
-                print(f"Car {car.id} has reached its destination!")
+def hint_callback():
+    request_hint()
+    return None
 
-        if not car.reached:
-            all_cars_reached = False
+def process_turn():
+    global move_mode, game_outcome, turns_left
+
+    # Only cars still driving can change, however many cars the level has
+    driving = simulation.driving_cars()
+    before = [(car.x, car.y) for car in driving]
+    outcome = simulation.step()
+    turns_left = simulation.turns_left
+    for car, old_cell in zip(driving, before):
+        move_in_index(car, old_cell)
+    grid_renderer.mark_cells(before)
+    grid_renderer.mark_cells((car.x, car.y) for car in driving)
+    if recording is not None:
+        recording.record_turn(simulation)
+    if outcome is None:
+        return
 
-    # Update the occupied tiles for the next turn
-    occupied_tiles.clear()
-    occupied_tiles.update(new_occupied_tiles)
+    if recording is not None:
+        save_recording()
 
-    # If all cars have reached their destinations, end the game
-    if all_cars_reached:
-        move_mode = False
-        game_outcome = "Success!"
+    # The game loop shows the result screen once game_outcome is set
+    move_mode = False
+    game_outcome = outcome
+    if outcome == SUCCESS:
         completed_levels[currentLevel] = True  # Mark the current level as completed
         if currentLevel < len(levels) - 1:
             completed_levels[currentLevel + 1] = True  # Unlock the next level
-        print("All cars have reached their destinations!")
-        display_result_screen()
-
-def display_result_screen():
-    global currentLevel
-
-    # Create a semi-transparent overlay
-    overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-    overlay.fill((0, 0, 0, 180))  # Black with transparency
-    screen.blit(overlay, (0, 0))
-
-    # Display the result text
-    font = pygame.font.Font(None, 72)
-    result_text = font.render(game_outcome, True, WHITE)
-    result_rect = result_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100))
-    screen.blit(result_text, result_rect)
-
-    # Create buttons for Restart, Next Level, and Main Menu
-    button_width = 200
-    button_height = 50
-    gap = 20
-    start_y = SCREEN_HEIGHT // 2
-
-    restart_btn = Button("Restart Level", (SCREEN_WIDTH - button_width) // 2, start_y, button_width, button_height, restart_game_callback_level)
-
-    # Only enable the "Next Level" button if the user succeeded
-    if game_outcome == "Success!":
-        next_level_btn = Button("Next Level", (SCREEN_WIDTH - button_width) // 2, start_y + button_height + gap, button_width, button_height, next_level_callback)
-    else:
-        next_level_btn = Button("Next Level (Locked)", (SCREEN_WIDTH - button_width) // 2, start_y + button_height + gap, button_width, button_height, lambda: None)
-        next_level_btn.color = GRAY  # Disable the button visually
 
-    main_menu_btn = Button("Main Menu", (SCREEN_WIDTH - button_width) // 2, start_y + 2 * (button_height + gap), button_width, button_height, main_menu_callback)
+def save_recording():
+    try:
+        append_replay(REPLAY_FILE, recording, max_bytes=REPLAY_MAX_BYTES)
+    except (OSError, ValueError) as error:
+        print(f"Could not save the replay: {error}")
 
-    # Draw buttons
-    buttons = [restart_btn, next_level_btn, main_menu_btn]
-    for btn in buttons:
-        btn.draw(screen)
+class ResultScene(Scene):
+    name = "result"
+
+    def __init__(self, outcome):
+        self.outcome = outcome
+        self.buttons = []
+        self.background = None
+
+    def enter(self):
+        # The result is shown over the level's last frame
+        self.background = screen.copy()
+
+        # Create buttons for Restart, Next Level, and Main Menu
+        button_width = 200
+        button_height = 50
+        gap = 20
+        start_y = SCREEN_HEIGHT // 2
+
+        restart_btn = Button("Restart Level", (SCREEN_WIDTH - button_width) // 2, start_y, button_width, button_height, restart_game_callback_level)
 
-    pygame.display.flip()
-
-    # Wait for user interaction
-    waiting = True
-    while waiting:
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                for btn in buttons:
-                    if btn.is_hovered(event.pos):
-                        btn.handle_event(event)
-                        waiting = False
+        # Only enable the "Next Level" button if the user succeeded
+        if self.outcome == SUCCESS:
+            next_level_btn = Button("Next Level", (SCREEN_WIDTH - button_width) // 2, start_y + button_height + gap, button_width, button_height, next_level_callback)
+        else:
+            next_level_btn = Button("Next Level (Locked)", (SCREEN_WIDTH - button_width) // 2, start_y + button_height + gap, button_width, button_height, lambda: None)
+            next_level_btn.color = GRAY  # Disable the button visually
+
+        main_menu_btn = Button("Main Menu", (SCREEN_WIDTH - button_width) // 2, start_y + 2 * (button_height + gap), button_width, button_height, main_menu_callback)
+        self.buttons = [restart_btn, next_level_btn, main_menu_btn]
+
+    def handle_event(self, event):
+        for btn in self.buttons:
+            transition = btn.handle_event(event)
+            if transition is not None:
+                return transition
+        return None
+
+    def draw(self, surface):
+        surface.blit(self.background, (0, 0))
+
+        # Create a semi-transparent overlay
+        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))  # Black with transparency
+        surface.blit(overlay, (0, 0))
+
+        # Display the result text
+        result_text = text_cache.render(self.outcome, 72, WHITE)
+        result_rect = result_text.get_rect(center=(SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2 - 100))
+        surface.blit(result_text, result_rect)
+
+        for btn in self.buttons:
+            btn.draw(surface)
+
+        draw_profiler_overlay()
+        with profiler.phase("present"):
+            pygame.display.flip()
 
 def next_level_callback():
-    global currentLevel
     if currentLevel < len(levels) - 1:
-        currentLevel += 1
-        load_level_game_loop()
-    else:
-        print("No more levels! Returning to main menu.")
-        main_menu()
+        return Reset(MainMenuScene(), LevelScene(currentLevel + 1))
+    print("No more levels! Returning to main menu.")
+    return Reset(MainMenuScene())
 
 def main_menu_callback():
-    main_menu()
-
-def level_selection_screen():
-    global currentLevel
-
-    # Define box dimensions
-    box_width = 100
-    box_height = 100
-    gap = 20
-    cols = 4  # Number of columns in the grid
-    rows = (len(levels) + cols - 1) // cols  # Calculate rows based on the number of levels
-    start_x = (SCREEN_WIDTH - (cols * box_width + (cols - 1) * gap)) // 2
-    start_y = (SCREEN_HEIGHT - (rows * box_height + (rows - 1) * gap)) // 2
-
-    # Create level boxes
-    level_boxes = []
-    for i, level in enumerate(levels):
-        col = i % cols
-        row = i // cols
-        x = start_x + col * (box_width + gap)
-        y = start_y + row * (box_height + gap)
-        rect = pygame.Rect(x, y, box_width, box_height)
-        level_boxes.append((rect, i))
-
-    clock = pygame.time.Clock()
-    running = True
-    while running:
-        screen.fill(WHITE)
+    return Reset(MainMenuScene())
+
+class LevelSelectionScene(Scene):
+    name = "level_selection"
+
+    # A page of level thumbnails; the grid pages instead of growing with the level count
+    COLS = 4
+    ROWS = 3
+    BOX = (160, 120)
+    GAP = 24
+
+    def __init__(self):
+        per_page = self.COLS * self.ROWS
+        self.pages = (len(levels) + per_page - 1) // per_page
+        self.page = min(currentLevel // per_page, self.pages - 1)
+        box_width, box_height = self.BOX
+        start_x = (SCREEN_WIDTH - (self.COLS * box_width + (self.COLS - 1) * self.GAP)) // 2
+        start_y = 160
+        self.slots = [pygame.Rect(start_x + col * (box_width + self.GAP), start_y + row * (box_height + self.GAP),
+                                  box_width, box_height)
+                      for row in range(self.ROWS) for col in range(self.COLS)]
+        self.surfaces = {}  # Level index -> thumbnail Surface for the page in view
+        self.veil = pygame.Surface(self.BOX, pygame.SRCALPHA)
+        self.veil.fill((255, 255, 255, 170))  # Washes out levels that are still locked
+
+        self.back_btn = Button("Back", 10, 10, 100, 40, lambda: Pop())
+        nav_y = start_y + self.ROWS * (box_height + self.GAP)
+        self.prev_btn = Button("< Prev", start_x, nav_y, 100, 36, lambda: self.turn_page(-1))
+        self.next_btn = Button("Next >", SCREEN_WIDTH - start_x - 100, nav_y, 100, 36, lambda: self.turn_page(1))
+
+    def enter(self):
+        self.show_page()
+
+    def page_levels(self, page):
+        per_page = self.COLS * self.ROWS
+        return range(page * per_page, min((page + 1) * per_page, len(levels)))
+
+    def level_boxes(self):
+        return zip(self.slots, self.page_levels(self.page))
+
+    def show_page(self):
+        """Asks for this page's thumbnails, then the next page's, so paging ahead finds them ready."""
+        self.surfaces = {}
+        wanted = list(self.page_levels(self.page))
+        if self.page + 1 < self.pages:
+            wanted += self.page_levels(self.page + 1)
+        cache = level_thumbnails()
+        cache.request(wanted)
+        for index in wanted:
+            self.add_surface(index)
+        self.dirty = True
+
+    def add_surface(self, index):
+        thumbnail = level_thumbnails().get(index)
+        if thumbnail is not None and index in self.page_levels(self.page):
+            width, height, pixels = thumbnail
+            self.surfaces[index] = pygame.image.frombuffer(pixels, (width, height), "RGB")
+
+    def turn_page(self, step):
+        page = max(0, min(self.pages - 1, self.page + step))
+        if page != self.page:
+            self.page = page
+            self.show_page()
+        return None
+
+    def wake_in(self, now):
+        # Finished thumbnails are picked up a couple of times a frame's worth of time
+        return 30 if level_thumbnails().pending else None
+
+    def update(self, now):
+        for index in level_thumbnails().poll():
+            if index in self.page_levels(self.page):
+                self.add_surface(index)
+                self.dirty = True
+        return None
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            # Check if a level box is clicked
+            for rect, level_index in self.level_boxes():
+                if rect.collidepoint(event.pos) and completed_levels[level_index]:
+                    return Replace(LevelScene(level_index))
+            if self.pages > 1:
+                self.prev_btn.handle_event(event)
+                self.next_btn.handle_event(event)
+        if event.type == pygame.MOUSEWHEEL:
+            self.turn_page(-event.y)
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_LEFT, pygame.K_PAGEUP):
+            self.turn_page(-1)
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_RIGHT, pygame.K_PAGEDOWN):
+            self.turn_page(1)
+        return self.back_btn.handle_event(event)
+
+    def draw(self, surface):
+        surface.fill(WHITE)
 
         # Draw title
-        title_font = pygame.font.Font(None, 72)
-        title_text = title_font.render("Level Selection", True, BLACK)
+        title_text = text_cache.render("Level Selection", 72, BLACK)
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 100))
-        screen.blit(title_text, title_rect)
-
-        # Draw level boxes
-        for rect, level_index in level_boxes:
+        surface.blit(title_text, title_rect)
+
+        # Draw level boxes: the thumbnail once it is ready, grey until then
+        for rect, level_index in self.level_boxes():
+            pygame.draw.rect(surface, GRAY, rect)
+            thumbnail = self.surfaces.get(level_index)
+            if thumbnail is not None:
+                surface.blit(thumbnail, thumbnail.get_rect(center=rect.center))
+            if not completed_levels[level_index]:
+                surface.blit(self.veil, rect)
+            # Completed (unlocked) levels get a green border
             if completed_levels[level_index]:
-                color = GREEN  # Fill with green if the level is completed
+                pygame.draw.rect(surface, GREEN, rect, 4)
             else:
-                color = GRAY  # Fill with gray if the level is not completed
-            pygame.draw.rect(screen, color, rect)
-            pygame.draw.rect(screen, BLACK, rect, 2)  # Border
+                pygame.draw.rect(surface, BLACK, rect, 2)
 
             # Draw level number
-            font = pygame.font.Font(None, 36)
-            text = font.render(str(level_index + 1), True, WHITE if completed_levels[level_index] else BLACK)
-            text_rect = text.get_rect(center=rect.center)
-            screen.blit(text, text_rect)
-
-        # Draw back button
-        back_btn = Button("Back", 10, 10, 100, 40, main_menu)
-        back_btn.draw(screen)
-
-        pygame.display.flip()
-
-        # Handle events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                # Check if a level box is clicked
-                for rect, level_index in level_boxes:
-                    if rect.collidepoint(event.pos) and completed_levels[level_index]:
-                        currentLevel = level_index
-                        load_level_game_loop()
-                        return
-                # Check if back button is clicked
-                if back_btn.is_hovered(event.pos):
-                    back_btn.handle_event(event)
-
-        clock.tick(60)
+            text = text_cache.render(str(level_index + 1), 28, BLACK)
+            label = text.get_rect(topleft=(rect.x + 6, rect.y + 6))
+            pygame.draw.rect(surface, WHITE, label.inflate(6, 2))
+            surface.blit(text, label)
+
+        # Draw back button and, with more than one page, the page controls
+        self.back_btn.draw(surface)
+        if self.pages > 1:
+            self.prev_btn.draw(surface)
+            self.next_btn.draw(surface)
+            page_text = text_cache.render(f"Page {self.page + 1} / {self.pages}", 28, BLACK)
+            surface.blit(page_text, page_text.get_rect(center=(SCREEN_WIDTH // 2, self.prev_btn.rect.centery)))
+
+        draw_profiler_overlay()
+        with profiler.phase("present"):
+            pygame.display.flip()
 
 # ================================
 # Main Menu (Splash Screen)
@@ -669,8 +1052,7 @@ class MenuButton:
 
     def draw(self, surface):
         pygame.draw.rect(surface, self.color, self.rect, border_radius=8)
-        font = pygame.font.Font(None, 36)
-        text_surface = font.render(self.text, True, WHITE)
+        text_surface = text_cache.render(self.text, 36, WHITE)
         text_rect = text_surface.get_rect(center=self.rect.center)
         surface.blit(text_surface, text_rect)
 
@@ -678,70 +1060,81 @@ class MenuButton:
         return self.rect.collidepoint(pos)
 
     def handle_event(self, event):
+        """Returns the callback's scene transition when clicked."""
         if event.type == pygame.MOUSEBUTTONDOWN:
             if event.button == 1 and self.is_hovered(event.pos):
-                self.callback()
+                return self.callback()
+        return None
 
 def start_level_callback():
-    load_level_game_loop()
+    return Push(LevelScene(currentLevel))
+
+def menu_level_selection_callback():
+    return Push(LevelSelectionScene())
 
 def quit_game_callback():
-    pygame.quit()
-    sys.exit()
-
-def main_menu():
-    title_font = pygame.font.SysFont("Arial", 72, bold=True)
-    button_width = 250
-    button_height = 60
-    gap = 20
-    total_height = 3 * button_height + 2 * gap
-    start_y = (SCREEN_HEIGHT - total_height) // 2 + 100
-
-    level_btn = MenuButton("Level Selection", (SCREEN_WIDTH - button_width) // 2,
-                           start_y, button_width, button_height, level_selection_screen)
-    predefined_btn = MenuButton("Start", (SCREEN_WIDTH - button_width) // 2,
-                                 start_y + button_height + gap, button_width, button_height, start_level_callback)
-    quit_btn = MenuButton("Quit", (SCREEN_WIDTH - button_width) // 2,
-                          start_y + 2 * (button_height + gap), button_width, button_height, quit_game_callback)
-    buttons = [level_btn, predefined_btn, quit_btn]
-
-    clock = pygame.time.Clock()
-    running = True
-    while running:
-        screen.fill(WHITE)
-        title_surface = title_font.render("Pathway Paver", True, BLACK)
+    return Quit()
+
+class MainMenuScene(Scene):
+    name = "main_menu"
+
+    def __init__(self):
+        button_width = 250
+        button_height = 60
+        gap = 20
+        total_height = 3 * button_height + 2 * gap
+        start_y = (SCREEN_HEIGHT - total_height) // 2 + 100
+
+        level_btn = MenuButton("Level Selection", (SCREEN_WIDTH - button_width) // 2,
+                               start_y, button_width, button_height, menu_level_selection_callback)
+        predefined_btn = MenuButton("Start", (SCREEN_WIDTH - button_width) // 2,
+                                     start_y + button_height + gap, button_width, button_height, start_level_callback)
+        quit_btn = MenuButton("Quit", (SCREEN_WIDTH - button_width) // 2,
+                              start_y + 2 * (button_height + gap), button_width, button_height, quit_game_callback)
+        self.buttons = [level_btn, predefined_btn, quit_btn]
+
+    def handle_event(self, event):
+        if event.type == pygame.MOUSEMOTION:
+            self.dirty = True  # Button hover colors follow the mouse
+        for btn in self.buttons:
+            transition = btn.handle_event(event)
+            if transition is not None:
+                return transition
+        return None
+
+    def draw(self, surface):
+        surface.fill(WHITE)
+        title_surface = text_cache.render("Pathway Paver", 72, BLACK, sysfont="Arial", bold=True)
         title_rect = title_surface.get_rect(center=(SCREEN_WIDTH // 2, 150))
-        screen.blit(title_surface, title_rect)
+        surface.blit(title_surface, title_rect)
 
         mouse_pos = pygame.mouse.get_pos()
-        for btn in buttons:
+        for btn in self.buttons:
             btn.color = btn.hover_color if btn.is_hovered(mouse_pos) else btn.base_color
-            btn.draw(screen)
+            btn.draw(surface)
 
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                quit_game_callback()
-            for btn in buttons:
-                btn.handle_event(event)
+        draw_profiler_overlay()
+        with profiler.phase("present"):
+            pygame.display.flip()
 
-        pygame.display.flip()
-        clock.tick(60)
+class HelpScene(Scene):
+    name = "help"
 
-def help_screen():
-    clock = pygame.time.Clock()
-    running = True
+    def __init__(self):
+        self.back_btn = Button("Back", (SCREEN_WIDTH - 200) // 2, SCREEN_HEIGHT - 100, 200, 50, lambda: Pop())
+
+    def handle_event(self, event):
+        return self.back_btn.handle_event(event)
 
-    while running:
-        screen.fill(WHITE)
+    def draw(self, surface):
+        surface.fill(WHITE)
 
         # Draw title
-        title_font = pygame.font.Font(None, 72)
-        title_text = title_font.render("How to Play", True, BLACK)
+        title_text = text_cache.render("How to Play", 72, BLACK)
         title_rect = title_text.get_rect(center=(SCREEN_WIDTH // 2, 100))
-        screen.blit(title_text, title_rect)
+        surface.blit(title_text, title_rect)
 
         # Draw instructions
-        font = pygame.font.Font(None, 36)
         instructions = [
             "Goal: Get all the cars to their destinations.",
             "1. Place road tiles to create paths for the cars.",
@@ -749,37 +1142,52 @@ def help_screen():
             "3. Cars will follow the shortest path to their destination.",
             "4. You have a limited number of tiles and turns.",
             "5. Avoid obstacles like trees (dark green tiles).",
+            "Stuck? Press H or Hint for the next tile to pave.",
         ]
         for i, line in enumerate(instructions):
-            text = font.render(line, True, BLACK)
+            text = text_cache.render(line, 36, BLACK)
             text_rect = text.get_rect(center=(SCREEN_WIDTH // 2, 200 + i * 40))
-            screen.blit(text, text_rect)
+            surface.blit(text, text_rect)
 
         # Draw back button
-        def set_running_false():
-            nonlocal running
-            running = False
-        back_btn = Button("Back", (SCREEN_WIDTH - 200) // 2, SCREEN_HEIGHT - 100, 200, 50, set_running_false)
-        back_btn.draw(screen)
-
-        pygame.display.flip()
-
-        # Handle events
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if back_btn.is_hovered(event.pos):
-                    back_btn.handle_event(event)
+        self.back_btn.draw(surface)
 
-        clock.tick(60)
+        draw_profiler_overlay()
+        with profiler.phase("present"):
+            pygame.display.flip()
 
 # ================================
 # Main Function
 # ================================
-def main():
-    main_menu()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play Pathway Paver.")
+    parser.add_argument("pack", nargs="?", help="Level pack to play instead of the built-in levels")
+    parser.add_argument("--replay", help="Watch a session from a replay file (see replay.py)")
+    parser.add_argument("--session", type=int, default=-1, help="Which session of the replay file (default: the last)")
+    parser.add_argument("--speed", type=int, default=1, help="Replay speed multiplier")
+    args = parser.parse_args(argv)
+    if args.speed < 1:
+        parser.error("--speed must be at least 1")
+
+    if args.pack:
+        load_level_pack(args.pack)
+    replay = None
+    if args.replay:
+        replay = read_replays(args.replay)[args.session]
+        if replay.level_index >= len(levels):
+            parser.error(f"The session was recorded on level {replay.level_index + 1}, which is not loaded")
+
+    init_display()
+    # One loop drives every screen; screens switch by returning transitions
+    manager = SceneManager(screen, MainMenuScene(), event_filter=handle_profiler_key)
+    if replay is not None:
+        manager.apply(Push(LevelScene(replay.level_index, replay=replay, speed=args.speed)))
+    manager.run()
+    if thumbnails is not None:
+        thumbnails.close()
+    pygame.quit()
+
+startup_times["import"] = time.perf_counter() - _import_started
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
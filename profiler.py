@@ -0,0 +1,132 @@
+"""Lightweight per-frame phase profiler.
+
+The scene loop marks its frames and the phases inside them (events, update,
+drawing, display flip). The last `capacity` frames are kept in a fixed-size
+ring buffer, summarized for the in-game overlay, and can be exported as
+Chrome trace JSON (open in chrome://tracing or https://ui.perfetto.dev).
+"""
+import json
+import time
+
+class _Phase:
+    """Reusable context manager that records one named phase of the current frame."""
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        frame = self.profiler._current
+        if frame is not None:
+            frame[2].append((self.name, self.start, time.perf_counter()))
+        return False
+
+class FrameProfiler:
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.frames = [None] * capacity  # Ring buffer of [screen, start, phases, end]
+        self.next_slot = 0
+        self.count = 0
+        self.enabled = True
+        self.overlay_visible = False
+        self._current = None
+        self._phases = {}
+        self.origin = time.perf_counter()
+
+    # --------------------------------
+    # Recording
+    # --------------------------------
+    def begin_frame(self, screen_name):
+        if self.enabled:
+            self._current = [screen_name, time.perf_counter(), [], None]
+
+    def end_frame(self):
+        frame = self._current
+        if frame is None:
+            return
+        frame[3] = time.perf_counter()
+        self.frames[self.next_slot] = frame
+        self.next_slot = (self.next_slot + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        self._current = None
+
+    def phase(self, name):
+        """`with profiler.phase("draw"):` times the block as part of the current frame."""
+        phase = self._phases.get(name)
+        if phase is None:
+            phase = self._phases[name] = _Phase(self, name)
+        return phase
+
+    def recorded(self):
+        """Recorded frames, oldest first."""
+        if self.count < self.capacity:
+            return self.frames[:self.count]
+        return self.frames[self.next_slot:] + self.frames[:self.next_slot]
+
+    def clear(self):
+        self.frames = [None] * self.capacity
+        self.next_slot = 0
+        self.count = 0
+
+    # --------------------------------
+    # Summaries
+    # --------------------------------
+    def summary(self):
+        """Frame time mean/p95/p99 and mean time per phase, in milliseconds."""
+        frames = self.recorded()
+        if not frames:
+            return None
+        durations = sorted((frame[3] - frame[1]) * 1000.0 for frame in frames)
+        phases = {}
+        for frame in frames:
+            for name, start, end in frame[2]:
+                phases[name] = phases.get(name, 0.0) + (end - start) * 1000.0
+        pick = lambda fraction: durations[min(len(durations) - 1, int(fraction * len(durations)))]
+        return {
+            "frames": len(durations),
+            "mean_ms": sum(durations) / len(durations),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": durations[-1],
+            "phases_ms": {name: total / len(durations) for name, total in phases.items()},
+        }
+
+    def overlay_lines(self):
+        stats = self.summary()
+        if stats is None:
+            return ["No frames recorded"]
+        lines = [
+            f"frame {stats['mean_ms']:.2f} ms  p95 {stats['p95_ms']:.2f}  p99 {stats['p99_ms']:.2f}",
+        ]
+        for name, mean in sorted(stats["phases_ms"].items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<10s} {mean:.3f} ms")
+        return lines
+
+    # --------------------------------
+    # Export
+    # --------------------------------
+    def chrome_trace(self):
+        """The recorded frames as a Chrome trace-event dict."""
+        to_us = lambda t: (t - self.origin) * 1e6
+        events = []
+        for screen_name, start, phases, end in self.recorded():
+            events.append({"name": screen_name, "cat": "frame", "ph": "X", "pid": 1, "tid": 1,
+                           "ts": to_us(start), "dur": (end - start) * 1e6})
+            for name, phase_start, phase_end in phases:
+                events.append({"name": name, "cat": "phase", "ph": "X", "pid": 1, "tid": 1,
+                               "ts": to_us(phase_start), "dur": (phase_end - phase_start) * 1e6})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+profiler = FrameProfiler()
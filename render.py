@@ -0,0 +1,332 @@
+"""Rendering helpers for Pathway Paver.
+
+The grid is drawn once, in chunks, into off-screen background surfaces. After
+that only the cells that changed (a placed tile, a moving car, a new route
+preview) are copied back to the screen and pushed with
+`pygame.display.update(rects)`. A `Camera` scrolls and zooms the view, and
+only the cells and chunks inside it are ever drawn or hit-tested.
+
+Fonts are created once and rendered text is kept in a small LRU cache, since
+building a `pygame.font.Font` every frame dominates frame time on slow boards.
+Cars and houses are likewise drawn once per look into a sprite atlas, so each
+one on screen costs a single blit.
+"""
+from collections import OrderedDict
+
+import pygame
+
+class Camera:
+    """Scrollable, zoomable view of a grid inside `viewport` (a screen rect).
+
+    `x`/`y` is the world pixel (at the current zoom) shown at the viewport's
+    top-left corner. Every screen/cell conversion goes through the camera, so
+    drawing and hit-testing only ever touch the cells in view.
+    """
+
+    ZOOM_SIZES = (10, 14, 20, 28, 36, 50, 70, 100)  # Tile sizes the zoom steps through
+
+    def __init__(self, cols, rows, viewport, tile_size):
+        self.cols = cols
+        self.rows = rows
+        self.viewport = pygame.Rect(viewport)
+        self.tile_size = tile_size
+        self.x = 0
+        self.y = 0
+
+    def clamp(self):
+        self.x = max(0, min(self.x, self.cols * self.tile_size - self.viewport.width))
+        self.y = max(0, min(self.y, self.rows * self.tile_size - self.viewport.height))
+
+    def pan(self, dx, dy):
+        """Scrolls by (dx, dy) pixels. Returns True if the view moved."""
+        before = (self.x, self.y)
+        self.x += dx
+        self.y += dy
+        self.clamp()
+        return (self.x, self.y) != before
+
+    def zoom(self, steps, pivot=None):
+        """Zooms in (steps > 0) or out around the screen point `pivot`. Returns True if it changed."""
+        sizes = self.ZOOM_SIZES
+        current = min(range(len(sizes)), key=lambda i: abs(sizes[i] - self.tile_size))
+        size = sizes[max(0, min(len(sizes) - 1, current + steps))]
+        if size == self.tile_size:
+            return False
+        px, py = pivot if pivot is not None else self.viewport.center
+        # Keep the world point under the pivot where it is on screen
+        wx = (px - self.viewport.x + self.x) / self.tile_size
+        wy = (py - self.viewport.y + self.y) / self.tile_size
+        self.tile_size = size
+        self.x = round(wx * size - (px - self.viewport.x))
+        self.y = round(wy * size - (py - self.viewport.y))
+        self.clamp()
+        return True
+
+    def cell_rect(self, x, y):
+        """Screen rect of a grid cell (possibly outside the viewport)."""
+        size = self.tile_size
+        return pygame.Rect(self.viewport.x + x * size - self.x, self.viewport.y + y * size - self.y, size, size)
+
+    def cell_at(self, px, py):
+        """The (x, y) cell under a screen point, or None outside the viewport or grid."""
+        if not self.viewport.collidepoint(px, py):
+            return None
+        x = (px - self.viewport.x + self.x) // self.tile_size
+        y = (py - self.viewport.y + self.y) // self.tile_size
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return x, y
+        return None
+
+    def cells_under(self, rect):
+        """(first_x, last_x, first_y, last_y) of the cells at least partly under a screen rect."""
+        size = self.tile_size
+        left = rect.left - self.viewport.x + self.x
+        top = rect.top - self.viewport.y + self.y
+        return (max(0, left // size), min(self.cols - 1, (left + rect.width - 1) // size),
+                max(0, top // size), min(self.rows - 1, (top + rect.height - 1) // size))
+
+    def visible_range(self):
+        """(first_x, last_x, first_y, last_y) of the cells at least partly in view."""
+        return self.cells_under(self.viewport)
+
+    def is_visible(self, x, y):
+        first_x, last_x, first_y, last_y = self.visible_range()
+        return first_x <= x <= last_x and first_y <= y <= last_y
+
+    def visible_cells(self):
+        first_x, last_x, first_y, last_y = self.visible_range()
+        return [(x, y) for y in range(first_y, last_y + 1) for x in range(first_x, last_x + 1)]
+
+class GridRenderer:
+    """Pre-rendered grid background, in chunks, plus the cells to push this frame.
+
+    The background is cut into CHUNK x CHUNK cell surfaces that are painted the
+    first time they come into view and kept in a bounded LRU, so maps of any
+    size cost memory and drawing time in proportion to the screen.
+    """
+
+    CHUNK = 16
+
+    def __init__(self, camera, draw_cell, max_chunks=256):
+        self.camera = camera
+        self.cols = camera.cols
+        self.rows = camera.rows
+        self.draw_cell = draw_cell    # draw_cell(surface, x, y, rect) paints one cell
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()   # (chunk_x, chunk_y) -> Surface at chunk_tile_size
+        self.chunk_tile_size = camera.tile_size
+        self.dirty_cells = set()
+        self.dirty_rects = []
+        self.full_redraw = True
+
+    def rebuild(self):
+        """Drops every painted chunk; they are repainted as they come into view."""
+        self.chunks.clear()
+        self.chunk_tile_size = self.camera.tile_size
+        self.full_redraw = True
+
+    def _chunk(self, chunk_x, chunk_y):
+        if self.chunk_tile_size != self.camera.tile_size:
+            self.rebuild()  # Zoomed: chunks were painted at another tile size
+        key = (chunk_x, chunk_y)
+        chunk = self.chunks.get(key)
+        if chunk is not None:
+            self.chunks.move_to_end(key)
+            return chunk
+        size = self.chunk_tile_size
+        first_x, first_y = chunk_x * self.CHUNK, chunk_y * self.CHUNK
+        width = min(self.CHUNK, self.cols - first_x)
+        height = min(self.CHUNK, self.rows - first_y)
+        chunk = pygame.Surface((width * size, height * size))
+        for y in range(first_y, first_y + height):
+            for x in range(first_x, first_x + width):
+                self.draw_cell(chunk, x, y, pygame.Rect((x - first_x) * size, (y - first_y) * size, size, size))
+        self.chunks[key] = chunk
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    def _visible_chunks(self):
+        first_x, last_x, first_y, last_y = self.camera.visible_range()
+        for chunk_y in range(first_y // self.CHUNK, last_y // self.CHUNK + 1):
+            for chunk_x in range(first_x // self.CHUNK, last_x // self.CHUNK + 1):
+                yield chunk_x, chunk_y
+
+    def cell_rect(self, x, y):
+        """Screen rect of a grid cell."""
+        return self.camera.cell_rect(x, y)
+
+    # --------------------------------
+    # Dirty tracking
+    # --------------------------------
+    def tile_changed(self, x, y):
+        """Repaints one background cell after its tile code changed."""
+        chunk = self.chunks.get((x // self.CHUNK, y // self.CHUNK))
+        if chunk is not None and self.chunk_tile_size == self.camera.tile_size:
+            size = self.chunk_tile_size
+            rect = pygame.Rect((x % self.CHUNK) * size, (y % self.CHUNK) * size, size, size)
+            self.draw_cell(chunk, x, y, rect)
+        self.mark_cell(x, y)
+
+    def mark_cell(self, x, y):
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            self.dirty_cells.add((x, y))
+
+    def mark_cells(self, cells):
+        for x, y in cells:
+            self.mark_cell(x, y)
+
+    def mark_area(self, rect):
+        """Restores and pushes every visible cell under `rect`, e.g. beneath an overlay."""
+        rect = pygame.Rect(rect)
+        area = rect.clip(self.camera.viewport)
+        if area.width and area.height:
+            first_x, last_x, first_y, last_y = self.camera.cells_under(area)
+            for y in range(first_y, last_y + 1):
+                for x in range(first_x, last_x + 1):
+                    self.dirty_cells.add((x, y))
+        self.dirty_rects.append(rect)
+
+    def mark_rect(self, rect):
+        """Pushes a non-grid area (e.g. the header) with the next present()."""
+        self.dirty_rects.append(pygame.Rect(rect))
+
+    def invalidate(self):
+        """Forces the next frame to redraw and flip the whole screen."""
+        self.full_redraw = True
+
+    # --------------------------------
+    # Drawing
+    # --------------------------------
+    def blit_background(self, surface):
+        """Draws the chunks in view; the caller clips the surface to the viewport."""
+        items = []
+        for chunk_x, chunk_y in self._visible_chunks():
+            chunk = self._chunk(chunk_x, chunk_y)
+            items.append((chunk, self.camera.cell_rect(chunk_x * self.CHUNK, chunk_y * self.CHUNK).topleft))
+        surface.blits(items, doreturn=False)
+
+    def restore_dirty(self, surface):
+        """Copies the background under every visible dirty cell back to the screen.
+
+        Returns the restored cells so the caller can redraw what sits on them.
+        """
+        camera = self.camera
+        first_x, last_x, first_y, last_y = camera.visible_range()
+        size = camera.tile_size
+        cells = set()
+        for x, y in self.dirty_cells:
+            if first_x <= x <= last_x and first_y <= y <= last_y:
+                chunk = self._chunk(x // self.CHUNK, y // self.CHUNK)
+                area = pygame.Rect((x % self.CHUNK) * size, (y % self.CHUNK) * size, size, size)
+                surface.blit(chunk, camera.cell_rect(x, y), area)
+                cells.add((x, y))
+        self.dirty_cells = cells
+        return cells
+
+    def present(self):
+        """Pushes this frame to the display and clears the dirty lists."""
+        if self.full_redraw:
+            pygame.display.flip()
+        else:
+            viewport = self.camera.viewport
+            rects = self.dirty_rects + [self.cell_rect(x, y).clip(viewport) for x, y in self.dirty_cells]
+            if rects:
+                pygame.display.update(rects)
+        self.full_redraw = False
+        self.dirty_cells = set()
+        self.dirty_rects = []
+
+class SpriteAtlas:
+    """Transparent sprites drawn once per key and reused for every later blit.
+
+    Sprites are painted at `size`; other sizes (camera zoom levels) are scaled
+    from that once and cached too.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.sprites = {}
+
+    def get(self, key, draw, size=None):
+        """The sprite for `key`, calling `draw(surface)` to paint it the first time."""
+        if size is not None and tuple(size) != tuple(self.size):
+            scaled_key = (key, tuple(size))
+            sprite = self.sprites.get(scaled_key)
+            if sprite is None:
+                sprite = self._finish(pygame.transform.smoothscale(self.get(key, draw), size))
+                self.sprites[scaled_key] = sprite
+            return sprite
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface(self.size, pygame.SRCALPHA)
+            draw(sprite)
+            sprite = self._finish(sprite)
+            self.sprites[key] = sprite
+        return sprite
+
+    def _finish(self, sprite):
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()  # Match the display format for faster blits
+        return sprite
+
+    def clear(self):
+        self.sprites.clear()
+
+class TextCache:
+    """Font registry plus a bounded LRU cache of rendered text surfaces.
+
+    Surfaces are keyed by (text, size, colour, font); `hits` and `misses`
+    count how often a render was served from the cache.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self.fonts = {}
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, size, sysfont=None, bold=False):
+        """The shared font for `size`; `sysfont` picks a system font such as "Arial"."""
+        key = (size, sysfont, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            if sysfont is None:
+                font = pygame.font.Font(None, size)
+            else:
+                font = pygame.font.SysFont(sysfont, size, bold=bold)
+            self.fonts[key] = font
+        return font
+
+    def render(self, text, size, color, sysfont=None, bold=False):
+        """Rendered, antialiased `text`; treat the returned surface as read-only."""
+        key = (text, size, tuple(color), sysfont, bold)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = self.font(size, sysfont, bold).render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.surfaces),
+            "fonts": len(self.fonts),
+        }
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+text_cache = TextCache()
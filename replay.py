@@ -0,0 +1,223 @@
+"""Compact binary replays of Pathway Paver sessions.
+
+A replay records which level was played, every road tile toggled (in click
+order), whether cooperative planning was on, and a hash of the car positions
+after each turn. Replaying applies the same toggles to a fresh `Simulation`
+and checks every turn against the recording, so a player's report can be
+reproduced exactly and thousands of recorded sessions re-run as a
+regression test without a window:
+
+    python replay.py verify [sessions.replays] [--pack levels.pack]
+    python replay.py list [sessions.replays]
+    python pathwaypaver.py --replay sessions.replays --session 3 --speed 4
+
+A replay file is any number of records back to back (see `HEADER`); the game
+appends one per finished level to `default_replay_path()`, in the per-user
+data directory, dropping the oldest sessions once the file reaches a cap.
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+from cooperative import CooperativePlanner
+from simulation import FAIL, SUCCESS, Simulation
+from userdirs import data_dir
+
+MAGIC = b"PPRP"
+VERSION = 1
+# magic, version, flags, outcome, level index, level checksum, toggle count, turn count
+HEADER = struct.Struct("<4sBBBxIIII")
+COOPERATIVE = 1  # Flag: cars were planned with CooperativePlanner
+OUTCOMES = {None: 0, SUCCESS: 1, FAIL: 2}
+OUTCOME_NAMES = {code: outcome for outcome, code in OUTCOMES.items()}
+
+def level_checksum(level):
+    """CRC32 of what decides how a level plays: its tiles, limits and extra cars."""
+    layout = level["layout"]
+    cols = len(layout[0])
+    crc = zlib.crc32(struct.pack("<ii", level["max_tiles"], level["max_turns"]))
+    for row in layout:
+        crc = zlib.crc32(bytes(row[:cols]), crc)
+    for car in level.get("cars", ()):
+        crc = zlib.crc32(struct.pack("<4H", *car), crc)
+    return crc
+
+def state_hash(sim):
+    """CRC32 of every car's cell as little-endian int32, taken after each turn."""
+    cells = sim.traffic.cells
+    return zlib.crc32(struct.pack(f"<{len(cells)}i", *cells))
+
+class Replay:
+    def __init__(self, level_index, level_crc, cooperative=False):
+        self.level_index = level_index
+        self.level_crc = level_crc
+        self.cooperative = cooperative
+        self.toggles = []      # (x, y) cells toggled, in click order
+        self.turn_hashes = []  # state_hash() after each turn
+        self.outcome = None    # SUCCESS, FAIL, or None if the session was not finished
+
+    @classmethod
+    def for_level(cls, level_index, level):
+        return cls(level_index, level_checksum(level))
+
+    def record_turn(self, sim):
+        self.turn_hashes.append(state_hash(sim))
+        self.outcome = sim.outcome
+
+    def check_turn(self, turn, sim):
+        """Compares turn `turn` (1-based) of `sim` with the recording; returns a mismatch message or None."""
+        if turn > len(self.turn_hashes):
+            return f"turn {turn} was never recorded"
+        if state_hash(sim) != self.turn_hashes[turn - 1]:
+            return f"cars are in different cells after turn {turn}"
+        if turn == len(self.turn_hashes) and sim.outcome != self.outcome:
+            return f"ended with {sim.outcome} instead of {self.outcome}"
+        return None
+
+    def planner(self):
+        return CooperativePlanner() if self.cooperative else None
+
+    # --------------------------------
+    # Encoding
+    # --------------------------------
+    def encode(self):
+        parts = [HEADER.pack(MAGIC, VERSION, COOPERATIVE if self.cooperative else 0,
+                             OUTCOMES[self.outcome], self.level_index, self.level_crc,
+                             len(self.toggles), len(self.turn_hashes))]
+        parts.append(struct.pack(f"<{2 * len(self.toggles)}H", *(v for cell in self.toggles for v in cell)))
+        parts.append(struct.pack(f"<{len(self.turn_hashes)}I", *self.turn_hashes))
+        return b"".join(parts)
+
+    @classmethod
+    def decode_from(cls, data, offset=0):
+        """Decodes the record at `offset`; returns (replay, offset of the next record)."""
+        if len(data) - offset < HEADER.size:
+            raise ValueError(f"Truncated replay record at byte {offset}")
+        magic, version, flags, outcome, level_index, level_crc, toggle_count, turn_count = \
+            HEADER.unpack_from(data, offset)
+        if magic != MAGIC:
+            raise ValueError(f"No replay record at byte {offset}")
+        if version != VERSION:
+            raise ValueError(f"Replay record version {version} is not supported")
+        end = offset + HEADER.size + 4 * toggle_count + 4 * turn_count
+        if end > len(data):
+            raise ValueError(f"Truncated replay record at byte {offset}")
+        replay = cls(level_index, level_crc, cooperative=bool(flags & COOPERATIVE))
+        at = offset + HEADER.size
+        cells = struct.unpack_from(f"<{2 * toggle_count}H", data, at)
+        replay.toggles = list(zip(cells[::2], cells[1::2]))
+        at += 4 * toggle_count
+        replay.turn_hashes = list(struct.unpack_from(f"<{turn_count}I", data, at))
+        replay.outcome = OUTCOME_NAMES[outcome]
+        return replay, end
+
+def default_replay_path():
+    """The replay file the game records to."""
+    return os.path.join(data_dir(), "sessions.replays")
+
+def append_replay(path, replay, max_bytes=None):
+    """Appends `replay` to `path`; past `max_bytes`, the oldest sessions are dropped to make room."""
+    record = replay.encode()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    if max_bytes is None or size + len(record) <= max_bytes:
+        with open(path, "ab") as out:
+            out.write(record)
+        return
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data) and len(data) - offset + len(record) > max_bytes:
+        _, offset = Replay.decode_from(data, offset)
+    # Written under a temporary name first, so a crash never loses the whole file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as out:
+        out.write(data[offset:])
+        out.write(record)
+    os.replace(temporary, path)
+
+def read_replays(path):
+    """Every replay recorded in `path`, in the order they were played."""
+    with open(path, "rb") as f:
+        data = f.read()
+    replays = []
+    offset = 0
+    while offset < len(data):
+        replay, offset = Replay.decode_from(data, offset)
+        replays.append(replay)
+    return replays
+
+# ================================
+# Playback
+# ================================
+def verify(replay, level):
+    """Re-runs `replay` headless on `level`; returns None if it played out as recorded, else why not."""
+    if level_checksum(level) != replay.level_crc:
+        return f"level {replay.level_index + 1} is not the level that was recorded"
+    sim = Simulation.from_level(level, planner=replay.planner())
+    for x, y in replay.toggles:
+        if not sim.toggle_tile(x, y):
+            return f"the tile at {(x, y)} could not be toggled"
+    for turn in range(1, len(replay.turn_hashes) + 1):
+        sim.step()
+        mismatch = replay.check_turn(turn, sim)
+        if mismatch is not None:
+            return mismatch
+    return None
+
+def verify_all(replays, levels):
+    """(index, message) for every replay that did not play out as recorded."""
+    failures = []
+    for index, replay in enumerate(replays):
+        if replay.level_index >= len(levels):
+            failures.append((index, f"level {replay.level_index + 1} is not in this level set"))
+            continue
+        mismatch = verify(replay, levels[replay.level_index])
+        if mismatch is not None:
+            failures.append((index, mismatch))
+    return failures
+
+def load_levels(pack_path=None):
+    if pack_path is None:
+        from presets import levels
+        return levels
+    from levelpack import LevelPack
+    return LevelPack(pack_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check or list recorded Pathway Paver sessions.")
+    parser.add_argument("command", choices=("verify", "list"))
+    parser.add_argument("path", nargs="?", default=default_replay_path(),
+                        help="Replay file written by the game (default: the one it records to)")
+    parser.add_argument("--pack", help="Level pack the sessions were played on (default: built-in levels)")
+    args = parser.parse_args(argv)
+
+    replays = read_replays(args.path)
+    if args.command == "list":
+        for index, replay in enumerate(replays):
+            planning = "cooperative" if replay.cooperative else "independent"
+            print(f"{index:>6}  level {replay.level_index + 1:<5} {len(replay.toggles):>4} toggles "
+                  f"{len(replay.turn_hashes):>5} turns  {planning:<11}  {replay.outcome}")
+        return 0
+
+    levels = load_levels(args.pack)
+    started = time.perf_counter()
+    failures = verify_all(replays, levels)
+    elapsed = time.perf_counter() - started
+    for index, message in failures:
+        print(f"Session {index}: {message}")
+    rate = len(replays) / elapsed if elapsed else float("inf")
+    print(f"{len(replays) - len(failures)}/{len(replays)} sessions replayed as recorded "
+          f"in {elapsed:.2f} s ({rate:.0f}/s)")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Flat scene stack for the game's screens.
+
+Menus, help, gameplay and results are `Scene`s. Instead of calling each
+other (which used to grow the call stack with every restart or level
+switch), a scene returns a transition from `handle_event` or `update`, and a
+single loop in `SceneManager.run` applies it. The stack only ever holds the
+handful of screens that are actually open.
+
+The loop idles when it can: a scene is only drawn when it marks itself
+`dirty`, and while nothing is dirty or animating the loop sleeps in
+`pygame.event.wait` until input arrives or the scene's next timer is due.
+"""
+import pygame
+
+from profiler import profiler
+
+# ================================
+# Transitions
+# ================================
+class Push:
+    """Open `scene` on top of the current one (which is paused, not closed)."""
+    def __init__(self, scene):
+        self.scene = scene
+
+class Pop:
+    """Close the current scene and resume the one below it."""
+
+class Replace:
+    """Close the current scene and open `scene` in its place."""
+    def __init__(self, scene):
+        self.scene = scene
+
+class Reset:
+    """Close every scene and open `scenes`, bottom first."""
+    def __init__(self, *scenes):
+        self.scenes = scenes
+
+class Quit:
+    """Close every scene, ending the game."""
+
+# ================================
+# Scenes
+# ================================
+class Scene:
+    name = "scene"  # Used to label profiler frames
+    dirty = True    # Needs drawing; the manager clears it after each draw
+
+    def enter(self):
+        """Called when the scene is opened."""
+
+    def exit(self):
+        """Called when the scene is closed."""
+
+    def resume(self):
+        """Called when the scene is back on top, or when its screen was drawn over."""
+
+    def wake_in(self, now):
+        """Milliseconds until the scene must update without input, 0 while animating, or None to sleep."""
+        return None
+
+    def handle_event(self, event):
+        return None
+
+    def update(self, now):
+        """Advances the scene; `now` is pygame.time.get_ticks()."""
+        return None
+
+    def draw(self, surface):
+        """Draws the scene and pushes it to the display."""
+
+class SceneManager:
+    def __init__(self, surface, scene, event_filter=None):
+        self.surface = surface
+        self.event_filter = event_filter  # event_filter(event) -> True if the screen needs a redraw
+        self.stack = []
+        self.apply(Push(scene))
+
+    @property
+    def top(self):
+        return self.stack[-1] if self.stack else None
+
+    def apply(self, transition):
+        if transition is None:
+            return
+        if isinstance(transition, Push):
+            self.stack.append(transition.scene)
+            transition.scene.enter()
+        elif isinstance(transition, Pop):
+            self.stack.pop().exit()
+            if self.stack:
+                self._redraw()
+        elif isinstance(transition, Replace):
+            if self.stack:
+                self.stack.pop().exit()
+            self.stack.append(transition.scene)
+            transition.scene.enter()
+        elif isinstance(transition, Reset):
+            self._close_all()
+            for scene in transition.scenes:
+                self.stack.append(scene)
+                scene.enter()
+        elif isinstance(transition, Quit):
+            self._close_all()
+        else:
+            raise TypeError(f"Not a scene transition: {transition!r}")
+
+    def _redraw(self):
+        self.top.dirty = True
+        self.top.resume()
+
+    def _close_all(self):
+        while self.stack:
+            self.stack.pop().exit()
+
+    def wait_for_events(self):
+        """Pending events, first sleeping until input or the top scene's timer if there is nothing to do."""
+        events = pygame.event.get()
+        if events or self.top.dirty:
+            return events
+        timeout = self.top.wake_in(pygame.time.get_ticks())
+        if timeout == 0:
+            return events
+        # event.wait(0) would block forever, so a due timer waits at least 1 ms
+        event = pygame.event.wait() if timeout is None else pygame.event.wait(max(1, int(timeout)))
+        if event.type == pygame.NOEVENT:
+            return []
+        return [event] + pygame.event.get()
+
+    def run(self, fps=60):
+        """The game's only loop; returns once the last scene is closed."""
+        clock = pygame.time.Clock()
+        while self.stack:
+            events = self.wait_for_events()
+            profiler.begin_frame(self.top.name)
+            with profiler.phase("events"):
+                for event in events:
+                    if event.type == pygame.QUIT:
+                        self.apply(Quit())
+                        break
+                    if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                        self._redraw()
+                    if self.event_filter is not None and self.event_filter(event):
+                        self._redraw()
+                    self.apply(self.top.handle_event(event))
+                    if not self.stack:
+                        break
+            if not self.stack:
+                break
+            with profiler.phase("update"):
+                self.apply(self.top.update(pygame.time.get_ticks()))
+            if self.stack and self.top.dirty:
+                self.top.draw(self.surface)
+                self.top.dirty = False
+            profiler.end_frame()
+            clock.tick(fps)
@@ -0,0 +1,321 @@
+"""Headless Pathway Paver simulation.
+
+Nothing in this module touches pygame, so a level can be set up, paved and
+played to its outcome without a window or the 500 ms movement tick. The
+game paces turns with `TurnClock`.
+Turns are run by the struct-of-arrays engine in `traffic.py`; the car
+objects are kept in step with it for the game to draw.
+"""
+from connectivity import Connectivity
+from pathfinding import FieldCache, GridHash
+from tiles import EMPTY, ROAD, CAR_START, CAR_TILES, COLOR_COUNT, DEST_TILES, HOUSE, LOCKED
+from traffic import Traffic
+
+SUCCESS = "Success!"
+FAIL = "Fail!"
+
+# ================================
+# Turn clock
+# ================================
+class TurnClock:
+    """Fixed-timestep accumulator that turns elapsed milliseconds into whole turns.
+
+    Time is banked at the current `speed` multiplier and spent `step_ms` at a
+    time, so turns come at an even pace whatever the frame rate, and a slow
+    frame is caught up on the next one instead of delaying every later turn.
+    At most `max_catch_up` turns are owed at once, so a long stall (a dragged
+    window, a breakpoint) does not fast-forward the level.
+    """
+
+    def __init__(self, step_ms, speed=1, max_catch_up=4):
+        self.step_ms = step_ms
+        self.speed = speed
+        self.max_catch_up = max_catch_up
+        self.banked = 0  # Simulated milliseconds not yet spent on a turn
+        self.last = 0
+
+    def start(self, now):
+        self.banked = 0
+        self.last = now
+
+    def _bank(self, now):
+        self.banked = min(self.banked + (now - self.last) * self.speed, self.max_catch_up * self.step_ms)
+        self.last = now
+
+    def set_speed(self, now, speed):
+        self._bank(now)  # Time so far counts at the old speed
+        self.speed = speed
+
+    def due(self, now):
+        """The number of turns to run now."""
+        self._bank(now)
+        turns = self.banked // self.step_ms
+        self.banked -= turns * self.step_ms
+        return turns
+
+    def wake_in(self, now):
+        """Real milliseconds until the next turn is due."""
+        owed = self.step_ms - self.banked - (now - self.last) * self.speed
+        return max(0, -(-owed // self.speed))
+
+# ================================
+# Simulation
+# ================================
+class SimCar:
+    def __init__(self, start_x, start_y):
+        self.x = start_x
+        self.y = start_y
+        self.path = []     # List of (x, y) positions
+        self.progress = 0  # Number of path positions already driven
+        self.id = None     # Car order id (0-based; display as id + 1)
+        self.destination = None  # Tuple (x, y)
+        self.reached = False
+
+    def next_step(self):
+        """The next position in the path, or None when there is none left."""
+        if self.progress < len(self.path):
+            return self.path[self.progress]
+        return None
+
+class Simulation:
+    """A single level: its grid, cars, placed tiles and turn state.
+
+    `layout` uses the same tile codes as `levels[...]["layout"]`. `placements`
+    is an iterable of (x, y) cells to pave before the cars start. `cars` adds
+    any number of cars beyond the ten the 80-89 codes allow, as (start_x,
+    start_y, dest_x, dest_y) entries on empty cells; they take the ids after
+    the layout's own. Pass a `car_factory` to build richer car objects (the
+    game passes its drawable `Car`), and `log` (e.g. `print`) to get the
+    per-turn messages. `planner(sim)` replaces the independent shortest paths
+    with one path per car in id order (see `cooperative.CooperativePlanner`).
+    `objects` is an optional (car_tiles, dest_tiles) pair of (x, y, id) lists
+    for the layout's 80-99 tiles, as stored in a level pack, which saves
+    scanning the grid for them.
+    """
+
+    def __init__(self, layout, max_turns, max_tiles=None, placements=(),
+                 cols=None, rows=None, car_factory=SimCar, log=None, cars=(), planner=None,
+                 objects=None):
+        self.rows = rows if rows is not None else len(layout)
+        self.cols = cols if cols is not None else len(layout[0])
+        self.grid = [list(layout[y][:self.cols]) for y in range(self.rows)]
+        self.max_turns = max_turns
+        self.max_tiles = max_tiles
+        self.turns_left = max_turns
+        self.tile_count = 0
+        self.log = log
+        self.planner = planner
+        self.cars = []
+        self.destinations = []  # List of (x, y, dest_id)
+        self.started = False
+        self.outcome = None     # SUCCESS or FAIL once the level is over
+        self.reason = None      # Why the level failed, if it did
+        self.grid_hash = None   # Zobrist hash of the grid, set once the cars and houses are in
+        self.fields = None      # Distance fields, repaired as tiles change
+        self._connectivity = None  # Built on first use; headless runs never need it
+
+        if objects is None:
+            objects = self._scan_objects()
+        car_tiles, dest_tiles = objects
+        for x, y, car_id in car_tiles:
+            car = car_factory(x, y)
+            car.id = car_id
+            self.cars.append(car)
+        for x, y, dest_id in dest_tiles:
+            self.destinations.append((x, y, dest_id))
+            self.grid[y][x] = HOUSE
+        # Layout cars are matched to houses by colour, not id: cars 0 and 4 both
+        # drive to the first red house. dest_tiles are listed row by row.
+        first_house = {}
+        for x, y, dest_id in dest_tiles:
+            first_house.setdefault(dest_id % COLOR_COUNT, (x, y))
+        for car in self.cars:
+            car.destination = first_house.get(car.id % COLOR_COUNT)
+        next_id = max([car.id + 1 for car in self.cars] +
+                      [dest_id + 1 for _, _, dest_id in self.destinations], default=0)
+        for car_id, (x, y, dest_x, dest_y) in enumerate(cars, start=next_id):
+            for cx, cy in ((x, y), (dest_x, dest_y)):
+                if not self.in_bounds(cx, cy) or self.grid[cy][cx] != EMPTY:
+                    raise ValueError(f"Car {car_id} needs an empty cell at {(cx, cy)}")
+            car = car_factory(x, y)
+            car.id = car_id
+            self.cars.append(car)
+            self.grid[y][x] = CAR_START
+            self.destinations.append((dest_x, dest_y, car_id))
+            self.grid[dest_y][dest_x] = HOUSE
+            car.destination = (dest_x, dest_y)  # Each extra car has a house of its own
+
+        # Paths are memoized on the grid's hash, which every toggle keeps current
+        self.grid_hash = GridHash(self.grid)
+        self.fields = FieldCache(self.grid, self.grid_hash)
+
+        # The engine's slots are the cars in id order; starting cells count as occupied
+        self.by_slot = sorted(self.cars, key=lambda c: c.id)
+        self.traffic = Traffic(self.cols, self.rows)
+        for car in self.by_slot:
+            self.traffic.add_car(car.id, car.x, car.y, car.destination)
+
+        for x, y in placements:
+            if not self.place_tile(x, y):
+                raise ValueError(f"Cannot place a road tile at {(x, y)}")
+
+    @classmethod
+    def from_level(cls, level, placements=(), **kwargs):
+        """Builds a simulation from an entry of `levels` or of a `levelpack.LevelPack`."""
+        if "car_tiles" in level:
+            kwargs.setdefault("objects", (level["car_tiles"], level["dest_tiles"]))
+        return cls(level["layout"], level["max_turns"], max_tiles=level["max_tiles"],
+                   placements=placements, cars=level.get("cars", ()), **kwargs)
+
+    def _scan_objects(self):
+        """The (x, y, id) cells of the car (80-89) and destination (90-99) tiles, row by row."""
+        car_tiles, dest_tiles = [], []
+        for y, row in enumerate(self.grid):
+            for x, tile in enumerate(row):
+                if tile in CAR_TILES:
+                    car_tiles.append((x, y, tile - 80))
+                elif tile in DEST_TILES:
+                    dest_tiles.append((x, y, tile - 90))
+        return car_tiles, dest_tiles
+
+    def _say(self, message):
+        if self.log is not None:
+            self.log(message)
+
+    @property
+    def occupied(self):
+        """Cells held by cars at the start of the next turn."""
+        return set(self.traffic.occupied_cells())
+
+    def driving_cars(self):
+        """Cars that have not reached their house yet, in id order."""
+        return [self.by_slot[slot] for slot in self.traffic.driving]
+
+    @property
+    def turns_used(self):
+        return self.max_turns - self.turns_left
+
+    # --------------------------------
+    # Tile placement
+    # --------------------------------
+    def in_bounds(self, x, y):
+        return 0 <= x < self.cols and 0 <= y < self.rows
+
+    def place_tile(self, x, y):
+        """Paves an empty cell. Returns True if the tile was placed."""
+        if not self.in_bounds(x, y) or self.grid[y][x] != EMPTY:
+            return False
+        if self.max_tiles is not None and self.tile_count >= self.max_tiles:
+            return False
+        self.grid[y][x] = ROAD
+        self.grid_hash.update(x, y, EMPTY, ROAD)
+        self.tile_count += 1
+        self.fields.cell_changed(x, y)
+        if self._connectivity is not None:
+            self._connectivity.cell_changed(x, y)
+        return True
+
+    def remove_tile(self, x, y):
+        """Clears a road cell. Returns True if the tile was removed."""
+        if not self.in_bounds(x, y) or self.grid[y][x] != ROAD:
+            return False
+        self.grid[y][x] = EMPTY
+        self.grid_hash.update(x, y, ROAD, EMPTY)
+        self.tile_count -= 1
+        self.fields.cell_changed(x, y)
+        if self._connectivity is not None:
+            self._connectivity.cell_changed(x, y)
+        return True
+
+    def toggle_tile(self, x, y):
+        """Places or removes a road tile the way a click does. Returns the change in tile count."""
+        if not self.in_bounds(x, y) or self.grid[y][x] in LOCKED:
+            return 0
+        if self.grid[y][x] == EMPTY:
+            return 1 if self.place_tile(x, y) else 0
+        if self.grid[y][x] == ROAD:
+            return -1 if self.remove_tile(x, y) else 0
+        return 0
+
+    @property
+    def connectivity(self):
+        """Components of the road and house cells, kept current as tiles are toggled."""
+        if self._connectivity is None:
+            self._connectivity = Connectivity(self.grid)
+        return self._connectivity
+
+    def connected(self, car):
+        """Whether `car` can currently reach its house at all."""
+        return self.connectivity.reaches((car.x, car.y), car.destination)
+
+    def route(self, car):
+        """The path `car` would take from where it is now on the current grid."""
+        if car.destination is None:
+            return []
+        # Cars sharing a destination share one distance field
+        return self.fields.path((car.x, car.y), car.destination)
+
+    # --------------------------------
+    # Turns
+    # --------------------------------
+    def start(self):
+        """Plans every car's path; called when the player presses SPACE."""
+        if self.planner is not None:
+            for car, path in zip(self.by_slot, self.planner(self)):
+                car.path = path
+        else:
+            for car in self.cars:
+                car.path = self.route(car)
+        for car in self.cars:
+            car.progress = 0
+        self.traffic.set_paths([car.path for car in self.by_slot])
+        self.started = True
+
+    def _finish(self, outcome, reason):
+        self.outcome = outcome
+        self.reason = reason
+        self._say(reason)
+        return outcome
+
+    def step(self):
+        """Runs one turn. Returns the outcome once the level is over, otherwise None."""
+        if self.outcome is not None:
+            return self.outcome
+        if not self.started:
+            self.start()
+
+        # Decrease the number of turns left
+        self.turns_left -= 1
+        self._say(f"Turns left: {self.turns_left}")
+
+        # Fail the level if no turns are left
+        if self.turns_left < 0:
+            return self._finish(FAIL, "No turns left! Game Over.")
+
+        traffic = self.traffic
+        on_wait = on_reach = None
+        if self.log is not None:
+            on_wait = lambda slot, cell: self._say(f"Car {traffic.ids[slot]} cannot move to "
+                                                   f"{(cell % self.cols, cell // self.cols)} because it is occupied!")
+            on_reach = lambda slot: self._say(f"Car {traffic.ids[slot]} has reached its destination!")
+        stuck = traffic.step(on_wait, on_reach)
+
+        # Only cars that moved need their objects updated
+        for slot in traffic.moved:
+            car = self.by_slot[slot]
+            car.x, car.y = traffic.position(slot)
+            car.progress += 1
+            car.reached = bool(traffic.reached[slot])
+
+        if stuck is not None:
+            # Fail the round if a car has no valid path
+            return self._finish(FAIL, f"Car {traffic.ids[stuck]} has no valid path! Game Over.")
+        if not traffic.driving:
+            return self._finish(SUCCESS, "All cars have reached their destinations!")
+        return None
+
+    def run(self):
+        """Plays the level to its outcome and returns it."""
+        while self.step() is None:
+            pass
+        return self.outcome
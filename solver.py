@@ -0,0 +1,391 @@
+"""Minimum-tile solver for Pathway Paver levels.
+
+The solver runs IDA* on the number of road tiles: for each budget, starting
+at a Steiner-tree lower bound, it picks one route per car (in id order) that
+costs at most the remaining budget, and checks each resulting road set with
+the same turn and occupancy rules as the game (`Simulation.run`). The first
+budget that yields a successful road set is the minimum.
+
+Only road sets that are a union of one route per car are searched, which is
+what every minimal solution looks like unless an extra tile is needed purely
+to change which of two equally short routes a car picks.
+"""
+import heapq
+import struct
+import time
+from collections import deque
+from itertools import combinations
+from operator import itemgetter
+
+from simulation import SUCCESS, Simulation
+from tiles import EMPTY, WALKABLE
+
+SOLVED = "solved"
+UNSOLVABLE = "unsolvable"
+TIMEOUT = "timeout"
+
+INFINITY = float("inf")
+PAUSE_EVERY = 128  # Cells a flood fill visits between calls to `_pause`
+FIRST_NODES = 6000  # Search nodes `first_roads` spends before leaving the level to IDA*
+
+class SolveTimeout(Exception):
+    pass
+
+class _GaveUp(Exception):
+    pass
+
+class SolveResult:
+    """What the solver found for one level."""
+
+    def __init__(self, status, placements=None, turns_used=None, lower_bound=0, nodes=0, elapsed=0.0):
+        self.status = status
+        self.placements = placements    # Sorted (x, y) road tiles to add to the paved ones, or None
+        self.turns_used = turns_used
+        self.lower_bound = lower_bound  # Tiles needed at least
+        self.nodes = nodes              # Search nodes expanded
+        self.elapsed = elapsed          # Seconds
+
+    @property
+    def tiles(self):
+        return len(self.placements) if self.placements is not None else None
+
+    def __repr__(self):
+        return f"SolveResult({self.status!r}, tiles={self.tiles}, turns_used={self.turns_used}, nodes={self.nodes})"
+
+class Solver:
+    def __init__(self, level, time_limit=None, node_limit=None, roads=()):
+        self.level = level
+        self.time_limit = time_limit
+        self.node_limit = node_limit  # Unlike time_limit, gives the same answer on any machine
+        self.roads = sorted(roads)    # Tiles already paved: they cost nothing and stay
+        sim = Simulation.from_level(level, placements=self.roads)
+        self.grid = sim.grid
+        self.rows = sim.rows
+        self.cols = sim.cols
+        self.cars = sorted(sim.cars, key=lambda c: c.id)
+        max_tiles = level["max_tiles"] if level.get("max_tiles") is not None else self.rows * self.cols
+        self.max_tiles = max_tiles - len(self.roads)
+        self.max_turns = level["max_turns"]
+        self._pause()
+        self.checked = {}   # frozenset of roads -> (outcome, turns used)
+        self.explored = {}  # (car index, frozenset of roads) -> largest budget known to fail
+        self.nodes = 0
+        self.deadline = None
+
+    # --------------------------------
+    # Grid helpers
+    # --------------------------------
+    def _neighbours(self, x, y):
+        for dx, dy in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.cols and 0 <= ny < self.rows:
+                yield nx, ny
+
+    def _cost(self, cell, roads):
+        """Tiles needed to drive onto `cell`: 0 if already drivable, 1 if it can be paved."""
+        x, y = cell
+        tile = self.grid[y][x]
+        if tile in WALKABLE or cell in roads:
+            return 0
+        if tile == EMPTY:
+            return 1
+        return INFINITY
+
+    def _tiles_to(self, destination, roads):
+        """0-1 BFS: tiles still needed to get from each cell to `destination`, excluding the cell itself."""
+        need = {destination: 0}
+        queue = deque([destination])
+        visited = 0
+        while queue:
+            cell = queue.popleft()
+            visited += 1
+            if visited % PAUSE_EVERY == 0:
+                self._pause()
+            step = need[cell] + self._cost(cell, roads)
+            if step == INFINITY:
+                continue
+            for neighbour in self._neighbours(*cell):
+                if self._cost(neighbour, roads) == INFINITY:
+                    continue
+                if step < need.get(neighbour, INFINITY):
+                    need[neighbour] = step
+                    # Zero-cost edges go to the front so cells settle in order
+                    if step == need[cell]:
+                        queue.appendleft(neighbour)
+                    else:
+                        queue.append(neighbour)
+        return need
+
+    def _car_lower_bound(self, car, roads, need=None):
+        if car.destination is None:
+            return INFINITY
+        if need is None:
+            need = self._tiles_to(car.destination, roads)
+        best = INFINITY
+        for neighbour in self._neighbours(car.x, car.y):
+            if neighbour in need:
+                best = min(best, self._cost(neighbour, roads) + need[neighbour])
+        return best
+
+    def lower_bound(self, first=0, roads=frozenset()):
+        """Tiles the cars from `first` on still need; the largest single-car need is admissible."""
+        bound = 0
+        for car in self.cars[first:]:
+            bound = max(bound, self._car_lower_bound(car, roads))
+        return bound
+
+    # --------------------------------
+    # Steiner lower bound
+    # --------------------------------
+    def _field_from(self, terminal):
+        """0-1 BFS: tiles on the cheapest way from `terminal` to each cell, counting the cell."""
+        reach = {terminal: 0}
+        queue = deque([terminal])
+        visited = 0
+        while queue:
+            cell = queue.popleft()
+            visited += 1
+            if visited % PAUSE_EVERY == 0:
+                self._pause()
+            for neighbour in self._neighbours(*cell):
+                cost = self._cost(neighbour, frozenset())
+                if cost == INFINITY:
+                    continue
+                step = reach[cell] + cost
+                if step < reach.get(neighbour, INFINITY):
+                    reach[neighbour] = step
+                    if cost == 0:
+                        queue.appendleft(neighbour)
+                    else:
+                        queue.append(neighbour)
+        return reach
+
+    def _spread(self, labels):
+        """Multi-source Dijkstra: min over v of labels[v] plus tiles from v to each cell, counting the cell."""
+        best = dict(labels)
+        heap = [(label, cell) for cell, label in labels.items()]
+        self._pause()
+        heapq.heapify(heap)
+        visited = 0
+        while heap:
+            value, cell = heapq.heappop(heap)
+            if value > best[cell]:
+                continue
+            visited += 1
+            if visited % PAUSE_EVERY == 0:
+                self._pause()
+            for neighbour in self._neighbours(*cell):
+                cost = self._cost(neighbour, frozenset())
+                if cost == INFINITY:
+                    continue
+                if value + cost < best.get(neighbour, INFINITY):
+                    best[neighbour] = value + cost
+                    heapq.heappush(heap, (value + cost, neighbour))
+        return best
+
+    def _steiner_tree(self, fields, left, right):
+        """Cheapest tree joining four terminals split `left` | `right` across a trunk u-v."""
+        # A trunk cell costs c, and each terminal field already counts it once
+        cost = lambda cell: self._cost(cell, frozenset())
+        q1, q2 = (fields[t] for t in right)
+        labels = {}
+        for count, v in enumerate(q1):
+            if count % PAUSE_EVERY == 0:
+                self._pause()
+            if v in q2 and cost(v) != INFINITY:
+                labels[v] = q1[v] + q2[v] - cost(v)
+        reach = self._spread(labels)
+        p1, p2 = (fields[t] for t in left)
+        best = INFINITY
+        for count, (u, value) in enumerate(reach.items()):
+            if count % PAUSE_EVERY == 0:
+                self._pause()
+            if u in p1 and u in p2 and cost(u) != INFINITY:
+                best = min(best, p1[u] + p2[u] - 2 * cost(u) + value)
+        return best
+
+    def steiner_bound(self):
+        """Lower bound from every pair of cars: either two separate routes or one shared tree.
+
+        Both routes' tiles are part of any solution, so the cheaper of the two
+        separate routes and the 4-terminal Steiner tree bounds the whole union.
+        """
+        bound = self.lower_bound()
+        cars = [car for car in self.cars if car.destination is not None]
+        fields = {}
+        for car in cars:
+            for terminal in ((car.x, car.y), car.destination):
+                if terminal not in fields:
+                    fields[terminal] = self._field_from(terminal)
+        for a, b in combinations(cars, 2):
+            self._tick()
+            a1, b1 = (a.x, a.y), a.destination
+            a2, b2 = (b.x, b.y), b.destination
+            separate = self._car_lower_bound(a, frozenset()) + self._car_lower_bound(b, frozenset())
+            tree = min(self._steiner_tree(fields, (a1, a2), (b1, b2)),
+                       self._steiner_tree(fields, (a1, b1), (a2, b2)),
+                       self._steiner_tree(fields, (a1, b2), (a2, b1)))
+            bound = max(bound, min(separate, tree))
+        return bound
+
+    # --------------------------------
+    # Search
+    # --------------------------------
+    def _tick(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SolveTimeout()
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SolveTimeout()
+
+    def _pause(self):
+        """Called between long stretches of work that are not search nodes; a subclass may pause here."""
+
+    def _walk_routes(self, car, roads, budget):
+        """Yields the new tiles of each route that gets `car` to its house within `budget`.
+
+        Cheaper-looking steps are tried first, so early routes are close to the
+        cheapest; the same set of tiles can come up more than once. Only routes
+        that never pass next to their own earlier cells are tried: the route a
+        car actually drives is a shortest path, and those never do.
+        """
+        destination = car.destination
+        need = self._tiles_to(destination, roads)
+        path = {(car.x, car.y)}
+        new_tiles = []
+
+        def extend(cell, spent, moves):
+            self._tick()
+            if cell == destination:
+                yield frozenset(new_tiles)
+                return
+            # A route longer than the turn limit can never finish in time
+            if moves + abs(cell[0] - destination[0]) + abs(cell[1] - destination[1]) > self.max_turns:
+                return
+            options = []
+            for neighbour in self._neighbours(*cell):
+                if neighbour in path or neighbour not in need:
+                    continue
+                # Cars drive shortest paths, which never come back alongside themselves
+                if any(m in path and m != cell for m in self._neighbours(*neighbour)):
+                    continue
+                cost = self._cost(neighbour, roads)
+                if spent + cost + need[neighbour] <= budget:
+                    options.append((cost + need[neighbour], neighbour, cost))
+            options.sort()
+            for _, neighbour, cost in options:
+                path.add(neighbour)
+                if cost:
+                    new_tiles.append(neighbour)
+                yield from extend(neighbour, spent + cost, moves + 1)
+                if cost:
+                    new_tiles.pop()
+                path.remove(neighbour)
+
+        return extend((car.x, car.y), 0, 0)
+
+    def _routes(self, car, roads, budget):
+        """Distinct sets of new tiles that give `car` a route to its house within `budget`, fewest first."""
+        found = set(self._walk_routes(car, roads, budget))
+        # Fewest new tiles first, ties by their sorted (x, y) cells. Packed big-endian,
+        # the cells compare as bytes, so thousands of routes sort without Python compares
+        keyed = []
+        for count, tiles in enumerate(found):
+            if count % 256 == 0:
+                self._pause()
+            cells = sorted(x * self.rows + y for x, y in tiles)
+            keyed.append((len(cells), struct.pack(f">{len(cells)}I", *cells), tiles))
+        keyed.sort(key=itemgetter(0, 1))
+        return [tiles for _, _, tiles in keyed]
+
+    def _check(self, roads):
+        result = self.checked.get(roads)
+        if result is None:
+            sim = Simulation.from_level(self.level, placements=sorted(roads.union(self.roads)))
+            # Played a turn at a time, so a long game is no single stretch of work
+            self._pause()
+            while sim.step() is None:
+                self._pause()
+            outcome = sim.outcome
+            result = (outcome, sim.turns_used)
+            self.checked[roads] = result
+        return result
+
+    def first_roads(self, nodes=FIRST_NODES):
+        """A quick answer that need not be minimal, or None if none turns up within `nodes` search nodes.
+
+        Depth-first with no budget but the level's own tile limit, taking each
+        car's routes in the order they are walked (cheapest-looking first) and
+        keeping the first road set the game plays to a success.
+        """
+        limit = self.nodes + nodes
+
+        def first(index, roads, budget):
+            if self.nodes > limit:
+                raise _GaveUp()
+            self._tick()
+            if index == len(self.cars):
+                return roads if self._check(roads)[0] == SUCCESS else None
+            if self.lower_bound(index, roads) > budget:
+                return None
+            tried = set()
+            for new_tiles in self._walk_routes(self.cars[index], roads, budget):
+                if new_tiles in tried:
+                    continue
+                tried.add(new_tiles)
+                found = first(index + 1, roads | new_tiles, budget - len(new_tiles))
+                if found is not None:
+                    return found
+            return None
+
+        try:
+            found = first(0, frozenset(), self.max_tiles)
+        except _GaveUp:
+            return None
+        return sorted(found) if found is not None else None
+
+    def _search(self, index, roads, budget):
+        self._tick()
+        if index == len(self.cars):
+            outcome, turns_used = self._check(roads)
+            return (roads, turns_used) if outcome == SUCCESS else None
+        key = (index, roads)
+        if self.explored.get(key, -1) >= budget:
+            return None
+        if self.lower_bound(index, roads) <= budget:
+            for new_tiles in self._routes(self.cars[index], roads, budget):
+                found = self._search(index + 1, roads | new_tiles, budget - len(new_tiles))
+                if found is not None:
+                    return found
+        self.explored[key] = budget
+        return None
+
+    def solve(self):
+        """Searches for a minimum-tile placement. Returns a SolveResult."""
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit if self.time_limit is not None else None
+        result = SolveResult(UNSOLVABLE)
+        try:
+            bound = self.steiner_bound()
+            result.lower_bound = bound
+            if bound != INFINITY:
+                for budget in range(bound, self.max_tiles + 1):
+                    found = self._search(0, frozenset(), budget)
+                    if found is not None:
+                        roads, turns_used = found
+                        result = SolveResult(SOLVED, sorted(roads), turns_used, bound)
+                        break
+                    result.lower_bound = budget + 1
+        except SolveTimeout:
+            result.status = TIMEOUT
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+
+def solve(level, time_limit=None, node_limit=None, roads=()):
+    """Finds a minimum-tile placement for `level` (an entry of `levels`), keeping any `roads` already paved."""
+    return Solver(level, time_limit=time_limit, node_limit=node_limit, roads=roads).solve()
+
+def solve_pack(levels, time_limit=None):
+    """Solves every level in turn; `time_limit` is in seconds per level."""
+    return [solve(level, time_limit=time_limit) for level in levels]
@@ -0,0 +1,45 @@
+"""A hint must turn up within a bounded amount of search, and must be one the game accepts."""
+from hints import HintEngine
+from presets import levels
+from simulation import SUCCESS, Simulation
+from solver import SOLVED, Solver
+
+SLICE = 0.006        # The game's own HINT_SLICE
+MAX_NODES = 120000   # Solver nodes to the first hint; the hardest shipped level needs ~94,000
+
+def _plays(level, roads):
+    return Simulation.from_level(level, placements=sorted(roads)).run() == SUCCESS
+
+def test_first_roads_are_within_the_limits():
+    for level in levels:
+        solver = Solver(level)
+        roads = solver.first_roads()
+        if roads is None:
+            continue
+        assert len(roads) <= level["max_tiles"]
+        assert _plays(level, roads)
+
+def test_hint_within_bounded_nodes():
+    # The same steps as a hint search: the quick answer, then IDA* if there is none.
+    # Counting nodes rather than seconds gives the same answer on any machine
+    for number, level in enumerate(levels, start=1):
+        solver = Solver(level, node_limit=MAX_NODES)
+        roads = solver.first_roads()
+        if roads is None:
+            result = solver.solve()
+            assert result.status == SOLVED, f"no hint for level {number} within {MAX_NODES} nodes"
+            roads = result.placements
+        assert len(roads) <= level["max_tiles"]
+        assert _plays(level, roads)
+
+def test_engine_publishes_a_playable_hint():
+    for level in levels:
+        engine = HintEngine(level)
+        engine.request()
+        while engine.target is None and engine.searching:
+            engine.run_slice(SLICE)
+        engine.cancel()
+        assert engine.target is not None
+        assert len(engine.target) <= level["max_tiles"]
+        assert _plays(level, engine.target)
+        assert engine.hint() is not None
@@ -0,0 +1,230 @@
+"""Level thumbnails for the level selection screen, rendered off the game's thread.
+
+A thumbnail is a small RGB image of a level's layout, one flat colour per
+tile, sampled down when the map has more cells than the image has pixels.
+Thumbnails are cached on disk as PPM files named after a hash of everything
+they show (layout, extra cars, size and palette), so an edited level gets a
+new one and an unchanged level is never drawn twice. The cache lives in the
+per-user cache directory, and only the `MAX_FILES` most recently shown
+thumbnails are kept there.
+
+`ThumbnailCache` hands the levels the screen asks for to worker processes,
+which read the cached file or render and write it. Only the levels in view
+(and the page after) are requested, so a pack of 100,000 levels costs no
+more than the pages the player actually looks at:
+
+    cache = ThumbnailCache(levels, palette={0: (255, 255, 255), 4: (0, 100, 0)})
+    cache.request(range(12))
+    ...
+    for index in cache.poll():           # once per frame
+        width, height, pixels = cache.get(index)
+"""
+import hashlib
+import os
+import struct
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from tiles import CAR_TILES, DEST_TILES, EMPTY
+from userdirs import cache_dir
+
+VERSION = 1           # Part of every key; bump it when rendering changes
+SIZE = (160, 120)     # Largest thumbnail, in pixels; maps keep their aspect ratio
+CACHE_DIR = os.path.join(cache_dir(), "thumbnails")
+MAX_FILES = 2000      # Thumbnails kept on disk (about 110 MB at SIZE); the least recently shown go first
+
+def _palette_bytes(palette):
+    """256 RGB triples, tile code -> colour; codes missing from `palette` draw as EMPTY."""
+    background = palette.get(EMPTY, (255, 255, 255))
+    return b"".join(bytes(palette.get(code, background)) for code in range(256))
+
+def _tiles(level):
+    """The layout's rows with the level's extra cars and houses drawn in as 80-99 codes."""
+    layout = level["layout"]
+    cols = len(layout[0])
+    tiles = [list(row[:cols]) for row in layout]
+    cars = level.get("cars", ())
+    if cars:
+        # Extra cars are numbered after the layout's own, as in Simulation
+        ids = [tile % 10 + 1 for row in tiles for tile in row if tile in CAR_TILES or tile in DEST_TILES]
+        for car_id, (x, y, dest_x, dest_y) in enumerate(cars, start=max(ids, default=0)):
+            tiles[y][x] = CAR_TILES[car_id % 10]
+            tiles[dest_y][dest_x] = DEST_TILES[car_id % 10]
+    return tiles
+
+def thumbnail_key(level, size=SIZE, palette=None):
+    """Hex digest of everything a level's thumbnail shows."""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(struct.pack("<HHH", VERSION, *size))
+    digest.update(_palette_bytes(palette or {}))
+    for row in _tiles(level):
+        digest.update(bytes(row))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+def render_thumbnail(level, size=SIZE, palette=None):
+    """(width, height, RGB bytes) of `level` scaled to fit `size`."""
+    colors = _palette_bytes(palette or {})
+    colors = [colors[3 * code:3 * code + 3] for code in range(256)]
+    tiles = _tiles(level)
+    rows, cols = len(tiles), len(tiles[0])
+    scale = min(size[0] / cols, size[1] / rows)
+    width = max(1, min(size[0], round(cols * scale)))
+    height = max(1, min(size[1], round(rows * scale)))
+    columns = [x * cols // width for x in range(width)]
+    lines = []
+    line, line_y = None, None
+    for py in range(height):
+        y = py * rows // height
+        if y != line_y:  # Rows of pixels over the same cells repeat the last one
+            row = tiles[y]
+            line, line_y = b"".join(colors[row[x]] for x in columns), y
+        lines.append(line)
+    return width, height, b"".join(lines)
+
+# ================================
+# Disk cache
+# ================================
+def write_ppm(path, width, height, pixels):
+    # Written under a temporary name first, so a reader never sees half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as out:
+        out.write(b"P6\n%d %d\n255\n" % (width, height))
+        out.write(pixels)
+    os.replace(temporary, path)
+
+def read_ppm(path):
+    """(width, height, RGB bytes) of a PPM written by `write_ppm`."""
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        magic, dims, depth, pixels = data.split(b"\n", 3)
+        width, height = map(int, dims.split())
+    except ValueError:
+        raise ValueError(f"{path} is not a thumbnail") from None
+    if magic != b"P6" or depth != b"255" or len(pixels) != 3 * width * height:
+        raise ValueError(f"{path} is not a thumbnail")
+    return width, height, pixels
+
+def load_or_render(level, directory, size=SIZE, palette=None):
+    """The cached thumbnail of `level`, rendering and caching it if there is none."""
+    path = os.path.join(directory, thumbnail_key(level, size, palette) + ".ppm")
+    try:
+        thumbnail = read_ppm(path)
+        os.utime(path)  # Marks it as recently shown for prune_cache
+        return thumbnail
+    except (OSError, ValueError):
+        pass
+    width, height, pixels = render_thumbnail(level, size, palette)
+    try:
+        write_ppm(path, width, height, pixels)
+    except OSError:
+        pass  # A read-only cache still shows the thumbnail, it just draws it again next time
+    return width, height, pixels
+
+def prune_cache(directory, keep=MAX_FILES):
+    """Deletes all but the `keep` most recently shown thumbnails in `directory`."""
+    thumbnails = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".ppm"):
+                try:
+                    thumbnails.append((entry.stat().st_mtime, entry.path))
+                except OSError:
+                    pass
+    if len(thumbnails) <= keep:
+        return
+    thumbnails.sort(reverse=True)
+    for _, path in thumbnails[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Already gone, or in use by another game; it is pruned next time
+
+# ================================
+# Worker processes
+# ================================
+_worker = None
+
+def _init_worker(levels, directory, size, palette):
+    global _worker
+    if isinstance(levels, str):
+        from levelpack import LevelPack
+        levels = LevelPack(levels)
+    _worker = (levels, directory, size, palette)
+
+def _thumbnail(index):
+    levels, directory, size, palette = _worker
+    return load_or_render(levels[index], directory, size, palette)
+
+class ThumbnailCache:
+    """Thumbnails of `levels` (a list or a `levelpack.LevelPack`), made by worker processes on request."""
+
+    def __init__(self, levels, directory=CACHE_DIR, size=SIZE, palette=None, workers=None, memory=256,
+                 disk=MAX_FILES):
+        self.levels = levels
+        self.directory = directory
+        self.size = size
+        self.palette = dict(palette or {})
+        # One core is left to the game's own loop
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.memory = memory         # Thumbnails kept in memory, least recently used dropped first
+        self.disk = disk             # Thumbnails kept on disk, pruned once per cache
+        self._ready = OrderedDict()  # index -> (width, height, RGB bytes)
+        self._pending = {}           # index -> Future
+        self._executor = None
+
+    def _start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # A pack is opened by each worker itself; a list is pickled once per worker
+        source = getattr(self.levels, "path", None) or list(self.levels)
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(source, self.directory, self.size, self.palette))
+        self._executor.submit(prune_cache, self.directory, self.disk)
+
+    @property
+    def pending(self):
+        return bool(self._pending)
+
+    def get(self, index):
+        """(width, height, RGB bytes) of level `index`, or None until it has been made."""
+        thumbnail = self._ready.get(index)
+        if thumbnail is not None:
+            self._ready.move_to_end(index)
+        return thumbnail
+
+    def request(self, indices):
+        """Makes `indices` the thumbnails wanted next, in order; queued ones not among them are dropped."""
+        wanted = [index for index in indices if index not in self._ready]
+        keep = set(wanted)
+        for index, future in list(self._pending.items()):
+            if index not in keep and future.cancel():
+                del self._pending[index]
+        if not wanted:
+            return
+        if self._executor is None:
+            self._start()
+        for index in wanted:
+            if index not in self._pending:
+                self._pending[index] = self._executor.submit(_thumbnail, index)
+
+    def poll(self):
+        """Indices whose thumbnails finished since the last call; never waits."""
+        finished = []
+        for index, future in list(self._pending.items()):
+            if not future.done():
+                continue
+            del self._pending[index]
+            if future.cancelled() or future.exception() is not None:
+                continue
+            self._ready[index] = future.result()
+            finished.append(index)
+        while len(self._ready) > self.memory:
+            self._ready.popitem(last=False)
+        return finished
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._pending.clear()
@@ -0,0 +1,14 @@
+"""Tile codes shared by the level layouts, the game and the headless tools."""
+
+EMPTY = 0              # Grass, road tiles may be placed here
+ROAD = 1               # Road tile placed by the player
+HOUSE = 3              # Destination cell (written over the 90-99 codes)
+TREE = 4               # Obstacle, road tiles cannot be placed here
+CAR_TILES = range(80, 90)   # 80 + car id
+CAR_START = 80              # Start cell of a car listed in a level's "cars"
+DEST_TILES = range(90, 100) # 90 + destination id
+COLOR_COUNT = 4             # Cars and houses come in id % 4 colours; a car drives to
+                            # the first house of its colour, row by row
+
+WALKABLE = (ROAD, HOUSE)    # Cells a car may drive onto
+LOCKED = (2, HOUSE, TREE)   # Cells the player cannot toggle
@@ -0,0 +1,123 @@
+"""Struct-of-arrays car engine used by `Simulation` to run turns.
+
+Cars are slots 0..n-1 in id order. Their cells, destinations and path
+cursors live in parallel `array`s, every path is packed into one flat array
+of cell indices (y * cols + x), and occupancy is a bytearray the size of the
+grid. A turn only visits the cars still driving and only clears the cells it
+marked, so its cost grows with the number of moving cars, not with the grid
+or with how far each car has already driven.
+"""
+from array import array
+
+NO_DESTINATION = -1
+
+class Traffic:
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.ids = array("l")
+        self.cells = array("l")         # Current cell of each car
+        self.destinations = array("l")  # Destination cell, or NO_DESTINATION
+        self.path_start = array("l")    # Each car's path is paths[path_start:path_end]
+        self.path_end = array("l")
+        self.cursor = array("l")        # Index in `paths` of the car's next cell
+        self.reached = bytearray()
+        self.paths = array("l")
+        self.occupied = bytearray(cols * rows)  # Cells held by cars this turn
+        self._marked = []               # Cells set in `occupied`, so clearing it is cheap
+        self._next = bytearray(cols * rows)
+        self.driving = []               # Slots of cars that have not reached their house
+        self.moved = []                 # Slots that advanced along their path in the last step
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add_car(self, car_id, x, y, destination=None):
+        """Adds a car parked at (x, y); cars must be added in id order. Returns its slot."""
+        slot = len(self.ids)
+        cell = y * self.cols + x
+        self.ids.append(car_id)
+        self.cells.append(cell)
+        self.destinations.append(NO_DESTINATION if destination is None
+                                 else destination[1] * self.cols + destination[0])
+        self.path_start.append(0)
+        self.path_end.append(0)
+        self.cursor.append(0)
+        self.reached.append(0)
+        self.driving.append(slot)
+        if not self.occupied[cell]:
+            self.occupied[cell] = 1
+            self._marked.append(cell)
+        return slot
+
+    def set_paths(self, paths):
+        """Loads one list of (x, y) cells per slot, replacing any earlier paths."""
+        cols = self.cols
+        flat = array("l")
+        for slot, path in enumerate(paths):
+            self.path_start[slot] = self.cursor[slot] = len(flat)
+            flat.extend(y * cols + x for x, y in path)
+            self.path_end[slot] = len(flat)
+        self.paths = flat
+
+    def position(self, slot):
+        cell = self.cells[slot]
+        return cell % self.cols, cell // self.cols
+
+    def occupied_cells(self):
+        return [(cell % self.cols, cell // self.cols) for cell in self._marked]
+
+    def step(self, on_wait=None, on_reach=None):
+        """Moves every driving car one cell along its path, lowest id first.
+
+        A car whose next cell is held (by a car that has not moved yet this turn,
+        or one that just moved there) waits. A path that repeats the car's cell
+        is a planned wait, during which the car holds its cell. Returns the slot
+        of the first car that has no path left, which ends the turn early,
+        otherwise None.
+        """
+        occupied, taken = self.occupied, self._next
+        cells, cursor, paths, path_end = self.cells, self.cursor, self.paths, self.path_end
+        destinations = self.destinations
+        marked = []
+        still_driving = []
+        moved = self.moved = []
+        driving = self.driving
+        for position, slot in enumerate(driving):
+            at = cursor[slot]
+            if at == path_end[slot]:
+                self.driving = still_driving + driving[position:]
+                return slot
+            cell = paths[at]
+            if cell == cells[slot]:
+                # A planned wait (see cooperative.py): the car keeps its cell
+                cursor[slot] = at + 1
+                taken[cell] = 1
+                marked.append(cell)
+                moved.append(slot)
+                still_driving.append(slot)
+                continue
+            if occupied[cell] or taken[cell]:
+                if on_wait is not None:
+                    on_wait(slot, cell)
+                still_driving.append(slot)
+                continue
+            cursor[slot] = at + 1
+            cells[slot] = cell
+            taken[cell] = 1
+            marked.append(cell)
+            moved.append(slot)
+            if cell == destinations[slot]:
+                self.reached[slot] = 1
+                if on_reach is not None:
+                    on_reach(slot)
+            else:
+                still_driving.append(slot)
+
+        # Cells taken this turn are the ones held next turn
+        for cell in self._marked:
+            occupied[cell] = 0
+        self.occupied, self._next = taken, occupied
+        self._marked = marked
+        self.driving = still_driving
+        return None
@@ -0,0 +1,33 @@
+"""Per-user directories the game keeps its files in, so nothing lands in the current directory.
+
+Follows each platform's convention: XDG_DATA_HOME / XDG_CACHE_HOME (or
+~/.local/share and ~/.cache) on Linux, ~/Library on macOS and %LOCALAPPDATA%
+on Windows. Nothing is created here; writers make the directory they need.
+"""
+import os
+import sys
+
+APP_NAME = "pathwaypaver"
+
+def _home(*parts):
+    return os.path.join(os.path.expanduser("~"), *parts)
+
+def data_dir():
+    """Directory for files worth keeping, such as recorded sessions."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or _home("AppData", "Local")
+    elif sys.platform == "darwin":
+        base = _home("Library", "Application Support")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or _home(".local", "share")
+    return os.path.join(base, APP_NAME)
+
+def cache_dir():
+    """Directory for files that can be made again, such as level thumbnails."""
+    if sys.platform == "win32":
+        return os.path.join(os.environ.get("LOCALAPPDATA") or _home("AppData", "Local"), APP_NAME, "Cache")
+    if sys.platform == "darwin":
+        base = _home("Library", "Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or _home(".cache")
+    return os.path.join(base, APP_NAME)
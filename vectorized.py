@@ -0,0 +1,136 @@
+"""Vectorized scoring of many candidate tile placements for one level.
+
+Candidate grids are stacked into an (N, rows, cols) uint8 array using the
+same tile codes as `levels[...]["layout"]`, and one BFS per destination is
+run for all N grids at once by shifting boolean frontiers. This needs NumPy
+(`pip install numpy`); the rest of the game does not.
+"""
+import numpy as np
+
+from simulation import FAIL, Simulation
+from tiles import EMPTY, ROAD, WALKABLE
+
+UNREACHABLE = -1
+INVALID = 255  # Written over cells that could not legally be paved
+
+class BatchResult:
+    """Per-candidate results of `evaluate`.
+
+    `path_lengths[i, k]` is the number of moves car k (in id order) needs on
+    candidate i, or UNREACHABLE. `predicted` is SUCCESS when every car can
+    reach its house within the turn limit, ignoring cars blocking each other;
+    `outcomes` holds exact results when `evaluate(..., exact=True)` was used.
+    """
+
+    def __init__(self, car_ids, valid, tiles_used, path_lengths, predicted, outcomes=None):
+        self.car_ids = car_ids
+        self.valid = valid              # (N,) placements legal and within max_tiles
+        self.tiles_used = tiles_used    # (N,)
+        self.path_lengths = path_lengths
+        self.reachable = path_lengths != UNREACHABLE
+        self.predicted = predicted      # (N,) bool
+        self.outcomes = outcomes
+
+    def __len__(self):
+        return len(self.valid)
+
+def base_grid(level):
+    """The level's starting grid (houses marked 3) as a (rows, cols) uint8 array."""
+    sim = Simulation.from_level(level)
+    return np.array(sim.grid, dtype=np.uint8), sim
+
+def stack_candidates(level, candidates):
+    """Stacks an iterable of placement lists into an (N, rows, cols) uint8 array.
+
+    A placement on a cell that is not empty (or was already paved) marks that
+    cell 255, which `evaluate` reports as an invalid candidate.
+    """
+    base, _ = base_grid(level)
+    rows, cols = base.shape
+    candidates = list(candidates)
+    grids = np.repeat(base[np.newaxis], len(candidates), axis=0)
+    for i, placements in enumerate(candidates):
+        for x, y in placements:
+            if not (0 <= x < cols and 0 <= y < rows):
+                raise ValueError(f"Placement {(x, y)} is outside the {cols}x{rows} grid")
+            grids[i, y, x] = ROAD if grids[i, y, x] == EMPTY else INVALID
+    return grids
+
+def distance_fields(grids, destination):
+    """BFS distances to `destination` for every grid in the stack, UNREACHABLE where cut off."""
+    n, rows, cols = grids.shape
+    walkable = np.isin(grids, WALKABLE)
+    dist = np.full((n, rows, cols), UNREACHABLE, dtype=np.int32)
+    dx, dy = destination
+    dist[:, dy, dx] = 0
+    frontier = np.zeros((n, rows, cols), dtype=bool)
+    frontier[:, dy, dx] = True
+    step = 0
+    while frontier.any():
+        step += 1
+        spread = np.zeros_like(frontier)
+        spread[:, 1:, :] |= frontier[:, :-1, :]
+        spread[:, :-1, :] |= frontier[:, 1:, :]
+        spread[:, :, 1:] |= frontier[:, :, :-1]
+        spread[:, :, :-1] |= frontier[:, :, 1:]
+        frontier = spread & walkable & (dist == UNREACHABLE)
+        dist[frontier] = step
+    return dist
+
+def _moves_from(dist, start):
+    """Moves from `start` (which need not be walkable) given a stack of distance fields."""
+    n, rows, cols = dist.shape
+    x, y = start
+    best = np.full(n, np.iinfo(np.int32).max, dtype=np.int64)
+    for dx, dy in [(1, 0), (0, 1), (-1, 0), (0, -1)]:
+        nx, ny = x + dx, y + dy
+        if 0 <= nx < cols and 0 <= ny < rows:
+            d = dist[:, ny, nx].astype(np.int64)
+            best = np.where(d != UNREACHABLE, np.minimum(best, d + 1), best)
+    return np.where(best == np.iinfo(np.int32).max, UNREACHABLE, best)
+
+def evaluate(level, grids, exact=False):
+    """Scores a stack of candidate grids (see `stack_candidates`) for `level`.
+
+    With `exact=True`, candidates predicted to succeed are replayed through the
+    headless Simulation, since cars waiting on each other can still run out
+    of turns.
+    """
+    grids = np.asarray(grids, dtype=np.uint8)
+    base, sim = base_grid(level)
+    cars = sorted(sim.cars, key=lambda c: c.id)
+    n = grids.shape[0]
+
+    placed = (grids == ROAD) & (base[np.newaxis] != ROAD)
+    tiles_used = placed.reshape(n, -1).sum(axis=1)
+    valid = ~(grids == INVALID).reshape(n, -1).any(axis=1)
+    if level.get("max_tiles") is not None:
+        valid &= tiles_used <= level["max_tiles"]
+
+    path_lengths = np.full((n, len(cars)), UNREACHABLE, dtype=np.int64)
+    fields = {}
+    for k, car in enumerate(cars):
+        if car.destination is None:
+            continue
+        # Cars sharing a destination share one stack of fields
+        if car.destination not in fields:
+            fields[car.destination] = distance_fields(grids, car.destination)
+        path_lengths[:, k] = _moves_from(fields[car.destination], (car.x, car.y))
+
+    reachable = (path_lengths != UNREACHABLE).all(axis=1)
+    longest = path_lengths.max(axis=1) if cars else np.zeros(n, dtype=np.int64)
+    predicted = valid & reachable & (longest <= level["max_turns"])
+
+    outcomes = None
+    if exact:
+        outcomes = np.full(n, FAIL, dtype=object)
+        for i in np.flatnonzero(predicted):
+            ys, xs = np.nonzero(placed[i])
+            placements = list(zip(xs.tolist(), ys.tolist()))
+            outcomes[i] = Simulation.from_level(level, placements=placements).run()
+
+    return BatchResult([car.id for car in cars], valid, tiles_used, path_lengths, predicted, outcomes)
+
+def evaluate_placements(level, candidates, exact=False):
+    """Convenience wrapper: stacks placement lists and evaluates them."""
+    return evaluate(level, stack_candidates(level, candidates), exact=exact)